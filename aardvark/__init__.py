@@ -2,11 +2,13 @@ import numpy as np
 
 # Base
 from aardvark.base.system import System
+from aardvark.base.history import HistoryReader
 
 # Builders
 
 # Components
 from aardvark.components.flow_channel.flow_channel import FlowChannel1D
+from aardvark.components.flow_channel.flow_channel_bank import FlowChannelBank
 
 # Functions
 from aardvark import functions
@@ -19,5 +21,6 @@ from aardvark.mesh.mesh_1d import Mesh1D
 
 # Solvers
 from aardvark.solvers.transient_solver import TransientSolver
+from aardvark.solvers.newton_system_solver import NewtonSystemSolver
 
 # System
@@ -0,0 +1,146 @@
+from aardvark.base.log import Log
+
+import re
+
+import numpy as np
+
+
+class Accelerator:
+    """ Base class for fixed-point accelerators of the System coupling loop.
+
+    One sweep over a group of coupled components maps the values x of the
+    connections that close the loop to new values g = G(x). Plain Gauss-Seidel
+    iteration takes g as the next iterate. An accelerator returns a better
+    next iterate from the history of x and g.
+
+    Vectors are passed scaled so that every entry is of order one.
+    """
+
+    name = "none"
+
+    def reset(self):
+        pass
+
+    def update(self, x: np.ndarray, g: np.ndarray) -> np.ndarray:
+        return g
+
+
+class Aitken(Accelerator):
+    """ Aitken dynamic relaxation (the Irons-Tuck form).
+
+    x_new = x + omega*(g - x), with omega updated every iteration from the
+    change in the residual r = g - x.
+
+    Attributes
+    ----------
+    omega_0 : float
+        Relaxation factor of the first iteration.
+
+    """
+
+    name = "aitken"
+
+    def __init__(self, omega_0: float = 1.0):
+        self.omega_0 = omega_0
+
+        self.reset()
+
+    def reset(self):
+        self.omega = self.omega_0
+        self.prev_r = None
+
+    def update(self, x: np.ndarray, g: np.ndarray) -> np.ndarray:
+        r = g - x
+
+        if(self.prev_r is not None):
+            dr = r - self.prev_r
+            dr2 = np.dot(dr, dr)
+
+            if(dr2 > 0):
+                self.omega = -self.omega*np.dot(self.prev_r, dr)/dr2
+
+            if(not np.isfinite(self.omega)):
+                self.omega = self.omega_0
+
+        self.prev_r = r
+
+        return x + self.omega*r
+
+
+class Anderson(Accelerator):
+    """ Anderson acceleration (type II) with a history of the last m
+    iterations.
+
+    The next iterate is the combination of the last m + 1 values of g whose
+    residuals r = g - x have the smallest combined norm, found by least
+    squares on the residual differences.
+
+    Attributes
+    ----------
+    m : int
+        Number of previous iterations kept.
+
+    """
+
+    name = "anderson"
+
+    def __init__(self, m: int = 5):
+        if(m < 1):
+            Log.error("Anderson acceleration needs a history of at least 1. Got m = " + str(m) + ".")
+
+        self.m = m
+        self.name = "anderson(" + str(m) + ")"
+
+        self.reset()
+
+    def reset(self):
+        self.prev_r = None
+        self.prev_g = None
+
+        self.dR = []
+        self.dG = []
+
+    def update(self, x: np.ndarray, g: np.ndarray) -> np.ndarray:
+        r = g - x
+
+        if(self.prev_r is not None):
+            self.dR.append(r - self.prev_r)
+            self.dG.append(g - self.prev_g)
+
+            if(len(self.dR) > self.m):
+                self.dR.pop(0)
+                self.dG.pop(0)
+
+        self.prev_r = r
+        self.prev_g = g
+
+        if(not self.dR):
+            return g
+
+        dR = np.column_stack(self.dR)
+        dG = np.column_stack(self.dG)
+
+        gamma = np.linalg.lstsq(dR, r, rcond=None)[0]
+
+        return g - dG @ gamma
+
+
+def create_accelerator(accel: str) -> Accelerator:
+    """ Creates an accelerator from its name. Options are None or "none",
+    "aitken", "anderson" and "anderson(m)" where m is the history length.
+    """
+    if(accel is None or accel == "none"):
+        return Accelerator()
+
+    if(accel == "aitken"):
+        return Aitken()
+
+    match = re.fullmatch(r"anderson(?:\((\d+)\))?", accel)
+
+    if(match is not None):
+        if(match.group(1) is None):
+            return Anderson()
+
+        return Anderson(int(match.group(1)))
+
+    Log.error("Unknown accel \"" + str(accel) + "\". Options are \"none\", \"aitken\", \"anderson\" and \"anderson(m)\".")
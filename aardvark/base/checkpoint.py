@@ -0,0 +1,68 @@
+import json
+import os
+
+import numpy as np
+
+
+def encode(value, key: str, arrays: dict):
+    """ Returns a JSON description of value. Arrays are put in arrays under
+    key, or a key starting with it for arrays nested in dicts and lists, and
+    referred to by key. Scalars are kept in the description. Python floats
+    are written by repr, so they round trip exactly.
+    """
+    if(value is None or isinstance(value, (bool, int, float, str))):
+        return {"value": value}
+
+    if(isinstance(value, np.generic)):
+        return {"value": value.item()}
+
+    if(isinstance(value, np.ndarray)):
+        arrays[key] = value
+
+        return {"array": key}
+
+    if(isinstance(value, dict)):
+        return {"dict": {str(name): encode(item, key + "/" + str(name), arrays) for name, item in value.items()}}
+
+    if(isinstance(value, (list, tuple))):
+        return {"list": [encode(item, key + "/" + str(n), arrays) for n, item in enumerate(value)]}
+
+    raise TypeError("Can not checkpoint \"" + key + "\" of type " + type(value).__name__ + ".")
+
+
+def decode(description: dict, arrays):
+    """ Inverse of encode. Tuples come back as lists. """
+    if("value" in description):
+        return description["value"]
+
+    if("array" in description):
+        return np.array(arrays[description["array"]])
+
+    if("dict" in description):
+        return {name: decode(item, arrays) for name, item in description["dict"].items()}
+
+    return [decode(item, arrays) for item in description["list"]]
+
+
+def write(path: str, layout: dict, arrays: dict):
+    """ Writes a compressed npz file holding arrays and the JSON layout.
+
+    The file is written next to path first and then moved over it, so an
+    interrupted write leaves the previous checkpoint intact.
+    """
+    temp_path = path + ".tmp"
+
+    with open(temp_path, "wb") as file:
+        np.savez_compressed(file, __layout__=np.array(json.dumps(layout)), **arrays)
+
+    os.replace(temp_path, path)
+
+
+def read(path: str) -> tuple:
+    """ Returns the layout and arrays of a file written by write. """
+    with np.load(path) as data:
+        arrays = {key: data[key] for key in data.files}
+
+    layout = json.loads(str(arrays.pop("__layout__")))
+
+    return layout, arrays
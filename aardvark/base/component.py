@@ -9,6 +9,10 @@ import numpy as np
 class Component(ABC):
     component_type = "Component"
 
+    # Attributes besides variables that solve updates. They are sent back
+    # when the component is solved in a worker process.
+    worker_state = ()
+
     @property
     def mesh(self):
         return self._mesh
@@ -28,9 +32,14 @@ class Component(ABC):
 
         self.parameters = None
 
+        self.time = 0.0
+
     def initialize(self, name: str):
         self.name = name
 
+        # Time at the end of the step being solved. Set by System.set_time.
+        self.time = 0.0
+
         self.variables = {}
         
         self.declare_variables()
@@ -38,6 +47,9 @@ class Component(ABC):
     def log_message(self, message: str):
         Log.message(self.name + " (" + self.component_type + ") :: " + message)
 
+    def log_warning(self, message: str):
+        Log.warning(self.name + " (" + self.component_type + ") :: " + message)
+
     def log_error(self, message: str):
         Log.error(self.name + " (" + self.component_type + ") :: " + message)
 
@@ -45,26 +57,26 @@ class Component(ABC):
         if(name in self.variables):
             self.log_error("Tried to add variable named \"" + name + "\" but a variable with that name already exists.")
 
-    def add_flow_state_var(self, name: str, units: str) -> variables.FlowStateVar:
+    def add_flow_state_var(self, name: str, units: str, n_channels: int = None) -> variables.FlowStateVar:
         self.check_variable_name(name)
 
-        variable = variables.FlowStateVar(self.name, name, units)
+        variable = variables.FlowStateVar(self.name, name, units, n_channels)
         self.variables[name] = variable
 
         return variable
     
-    def add_float_var(self, name: str, units: str) -> variables.FloatVar:
+    def add_float_var(self, name: str, units: str, n_channels: int = None) -> variables.FloatVar:
         self.check_variable_name(name)
 
-        variable = variables.FloatVar(self.name, name, units)
+        variable = variables.FloatVar(self.name, name, units, n_channels)
         self.variables[name] = variable
         
         return variable
     
-    def add_mesh1d_var(self, name: str, units: str, var_type: str) -> variables.Mesh1DVar:
+    def add_mesh1d_var(self, name: str, units: str, var_type: str, n_channels: int = None) -> variables.Mesh1DVar:
         self.check_variable_name(name)
 
-        variable = variables.Mesh1DVar(self.name, name, units, var_type)
+        variable = variables.Mesh1DVar(self.name, name, units, var_type, n_channels)
         self.variables[name] = variable
         
         return variable
@@ -92,6 +104,47 @@ class Component(ABC):
 
         return np.sqrt(r2)
 
+    def get_worker_result(self) -> tuple:
+        """ Returns what solve changed, to send back from a worker process. """
+        values = {name: (variable.value, variable.prev_value) for name, variable in self.variables.items()}
+        state = {name: getattr(self, name) for name in self.worker_state}
+
+        return values, state
+
+    def set_worker_result(self, result: tuple):
+        """ Copies the result of a solve in a worker process into this
+        component. The variable objects are kept since connections refer to
+        them.
+        """
+        values, state = result
+
+        for name, (value, prev_value) in values.items():
+            variable = self.variables[name]
+
+            variable.value = value
+            variable.prev_value = prev_value
+
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def get_profile_counters(self) -> dict:
+        """ Returns counters of the last solve for a Profiler, e.g. numbers
+        of iterations. Names ending in _max are kept as a maximum over
+        solves and the others are summed. Counters can be arrays, e.g. one
+        count per node, which are summed element by element.
+        """
+        return {}
+
+    def get_checkpoint_state(self) -> dict:
+        """ Returns the attributes besides variables that a restart needs to
+        continue exactly where it left off. By default the worker_state.
+        """
+        return {name: getattr(self, name) for name in self.worker_state}
+
+    def set_checkpoint_state(self, state: dict):
+        for name, value in state.items():
+            setattr(self, name, value)
+
     def check_initials(self):
         variable: variables.Variable
         for variable in self.variables.values():
@@ -100,5 +153,14 @@ class Component(ABC):
     def march(self):
         variable: variables.Variable
         for variable in self.variables.values():
+            # Aliases are marched with their source.
+            if(variable.alias_of is not None):
+                continue
+
             variable.value = variable.initial
-            variable.prev_value = variable.initial
\ No newline at end of file
+            variable.prev_value = variable.initial
+
+    def advance(self):
+        variable: variables.Variable
+        for variable in self.variables.values():
+            variable.initial = variable.value
@@ -1,5 +1,21 @@
 from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+# Record returned by Fluid.state_from_T_P. Fields are accessed by name, e.g.
+# state["rho"].
+state_dtype = np.dtype([("rho", float), ("cp", float), ("mu", float), ("k", float), ("e", float)])
+
 class Fluid(ABC):
+    """ Base class for fluid property backends.
+
+    Every *_from_T_P method and T_from_e_P must accept NumPy arrays of any
+    shape (or scalars) for both arguments, broadcast them against each other
+    and return an array of the broadcast shape. Scalar inputs return a
+    scalar. Callers can then evaluate a whole mesh or bank of channels in one
+    call instead of looping over states in Python.
+    """
     
     @abstractmethod
     def rho_from_T_P(self, T: float, P: float) -> float:
@@ -25,8 +41,54 @@ class Fluid(ABC):
     def T_from_e_P(self, e: float, P: float) -> float:
         pass
 
+    def T_from_e_P_guess(self, e: float, P: float, T_guess: float) -> float:
+        """ Inverse equation of state given T_guess, an estimate of the
+        answer such as the temperature from the previous iteration. Channels
+        call this instead of T_from_e_P.
+
+        Iterative backends should override this to start from T_guess. The
+        default ignores it and calls T_from_e_P, so backends written against
+        T_from_e_P(e, P) keep working.
+        """
+        return self.T_from_e_P(e, P)
+
+    def e_dedT_from_T_P(self, T: float, P: float) -> tuple:
+        """ Returns e and its derivative with temperature at constant
+        pressure, for Newton iterations on the equation of state.
+
+        Backends that can evaluate both from a single flash should override
+        this. The default uses a forward difference.
+        """
+        T, P = np.broadcast_arrays(np.asarray(T, dtype=float), np.asarray(P, dtype=float))
+
+        dT = 1e-6*T
+
+        e = self.e_from_T_P(T, P)
+        dedT = (self.e_from_T_P(T + dT, P) - e)/dT
+
+        return e, dedT
+
+    def state_from_T_P(self, T: float, P: float) -> np.ndarray:
+        """ Returns rho, cp, mu, k and e at (T, P) as a record array of
+        state_dtype with the broadcast shape of T and P.
+
+        Backends that can evaluate every property from a single equation of
+        state flash should override this. The default calls each property
+        method in turn.
+        """
+        T, P = np.broadcast_arrays(np.asarray(T, dtype=float), np.asarray(P, dtype=float))
+
+        state = np.empty(T.shape, dtype=state_dtype)
+        state["rho"] = self.rho_from_T_P(T, P)
+        state["cp"] = self.cp_from_T_P(T, P)
+        state["mu"] = self.mu_from_T_P(T, P)
+        state["k"] = self.k_from_T_P(T, P)
+        state["e"] = self.e_from_T_P(T, P)
+
+        return state
+
     # @abstractmethod
     # def h_from_T_P(self, T: float, P: float) -> float:
     #     pass
 
-    
\ No newline at end of file
+    
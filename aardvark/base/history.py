@@ -0,0 +1,246 @@
+from aardvark.base.variables import Variable
+from aardvark.base.log import Log
+
+import json
+import os
+
+import numpy as np
+
+
+class HistoryWriter:
+    """ Streams the values of selected variables over time to disk.
+
+    Records are kept in memory until chunk_size of them are collected and
+    are then written as one compressed npz file per chunk, holding the time
+    and one array of shape (n_records, *variable shape) per variable. The
+    memory use is bounded by one chunk whatever the length of the run.
+    index.json lists the variables and the chunks written so far and is
+    replaced after each chunk, so the history of an interrupted run can be
+    read up to its last chunk.
+
+    Variables are named "component :: variable" in the history.
+
+    Attributes
+    ----------
+    path : str
+        Folder the history is written to.
+
+    variables : list[Variable]
+        Variables that are recorded.
+
+    chunk_size : int
+        Number of records per chunk.
+
+    """
+
+    def __init__(self, path: str, variables: list, chunk_size: int = 100):
+        if(chunk_size < 1):
+            Log.error("History chunk_size must be at least 1. Got " + str(chunk_size) + ".")
+
+        self.path = path
+        self.variables = list(variables)
+        self.chunk_size = chunk_size
+
+        self.names = [history_name(variable) for variable in self.variables]
+
+        if(len(set(self.names)) != len(self.names)):
+            Log.error("A variable is recorded in the history more than once.")
+
+        os.makedirs(path, exist_ok=True)
+
+        self._times = []
+        self._records = {name: [] for name in self.names}
+
+        self._index = {"variables": {}, "chunks": [], "n_records": 0}
+
+        self.write_index()
+
+    def record(self, time: float):
+        variable: Variable
+        for n, (name, variable) in enumerate(zip(self.names, self.variables)):
+            # Values are views of the System state, so they are copied.
+            value = np.array(variable.value, dtype=float)
+
+            if(name not in self._index["variables"]):
+                self._index["variables"][name] = {"key": "v%i" % n, "shape": list(value.shape), "units": variable.units}
+
+            self._records[name].append(value)
+
+        self._times.append(time)
+
+        if(len(self._times) >= self.chunk_size):
+            self.flush()
+
+    def flush(self):
+        """ Writes the records collected since the last chunk. """
+        if(not self._times):
+            return
+
+        file_name = "chunk_%06i.npz" % len(self._index["chunks"])
+
+        arrays = {"time": np.array(self._times)}
+
+        for name in self.names:
+            arrays[self._index["variables"][name]["key"]] = np.stack(self._records[name])
+
+        with open(os.path.join(self.path, file_name), "wb") as file:
+            np.savez_compressed(file, **arrays)
+
+        self._index["chunks"].append({"file": file_name, "start": self._index["n_records"], "size": len(self._times),
+                                      "t_start": self._times[0], "t_end": self._times[-1]})
+        self._index["n_records"] += len(self._times)
+
+        self.write_index()
+
+        self._times = []
+        self._records = {name: [] for name in self.names}
+
+    def write_index(self):
+        temp_path = os.path.join(self.path, "index.json.tmp")
+
+        with open(temp_path, "w") as file:
+            json.dump(self._index, file, indent=1)
+
+        os.replace(temp_path, os.path.join(self.path, "index.json"))
+
+    def close(self):
+        self.flush()
+
+
+class HistoryReader:
+    """ Reads a history written by HistoryWriter.
+
+    Nothing but the index is read when the reader is created. Indexing the
+    reader with a variable name gives a HistoryVariable, and slicing that
+    over time only loads the chunks the slice touches:
+
+        history = HistoryReader("output/Case/history")
+        T_out = history["fc1 :: outlet"][100:200, 0]
+
+    Attributes
+    ----------
+    path : str
+        Folder of the history.
+
+    names : list[str]
+        Names of the recorded variables.
+
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        index_path = os.path.join(path, "index.json")
+
+        if(not os.path.isfile(index_path)):
+            Log.error("No history found at \"" + path + "\".")
+
+        with open(index_path) as file:
+            self._index = json.load(file)
+
+        self.names = list(self._index["variables"])
+
+        self._starts = np.array([chunk["start"] for chunk in self._index["chunks"]], dtype=int)
+
+    def __len__(self):
+        return self._index["n_records"]
+
+    def __getitem__(self, name: str):
+        if(name not in self._index["variables"]):
+            Log.error("\"" + name + "\" is not in the history. Recorded variables are " + ", ".join(self.names) + ".")
+
+        return HistoryVariable(self, name)
+
+    @property
+    def time(self) -> np.ndarray:
+        return self.read("time", slice(None))
+
+    def read(self, key: str, records) -> np.ndarray:
+        """ Returns the records of key selected by records, an int, a slice
+        or an array of record numbers, loading only the chunks they are in.
+        """
+        n_records = len(self)
+
+        if(isinstance(records, slice)):
+            numbers = np.arange(n_records)[records]
+
+        else:
+            numbers = np.asarray(records, dtype=int)
+
+            if(np.any(numbers >= n_records) or np.any(numbers < -n_records)):
+                Log.error("Record out of range for a history of " + str(n_records) + " records.")
+
+            numbers = np.where(numbers < 0, numbers + n_records, numbers)
+
+        flat = np.ravel(numbers)
+
+        chunk_of = np.searchsorted(self._starts, flat, side="right") - 1
+
+        parts = [None]*flat.size
+
+        for c in np.unique(chunk_of):
+            chunk = self._index["chunks"][c]
+
+            with np.load(os.path.join(self.path, chunk["file"])) as data:
+                values = data[key]
+
+            for n in np.flatnonzero(chunk_of == c):
+                parts[n] = values[flat[n] - chunk["start"]]
+
+        if(numbers.ndim == 0):
+            return parts[0]
+
+        if(not parts):
+            return np.zeros((0,) + self.shape(key))
+
+        return np.stack(parts).reshape(numbers.shape + np.shape(parts[0]))
+
+    def shape(self, key: str) -> tuple:
+        if(key == "time"):
+            return ()
+
+        for variable in self._index["variables"].values():
+            if(variable["key"] == key):
+                return tuple(variable["shape"])
+
+
+class HistoryVariable:
+    """ One variable of a HistoryReader. Indexing it reads from disk, with
+    time as the first axis.
+    """
+
+    def __init__(self, reader: HistoryReader, name: str):
+        self.reader = reader
+        self.name = name
+
+        variable = reader._index["variables"][name]
+
+        self.key = variable["key"]
+        self.units = variable["units"]
+        self.shape = (len(reader),) + tuple(variable["shape"])
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        if(not isinstance(index, tuple)):
+            index = (index,)
+
+        values = self.reader.read(self.key, index[0])
+
+        if(len(index) == 1):
+            return values
+
+        # The remaining indices apply to each record.
+        if(np.ndim(index[0]) == 0 and not isinstance(index[0], slice)):
+            return values[index[1:]]
+
+        return values[(slice(None),) + index[1:]]
+
+    def values(self) -> np.ndarray:
+        """ Returns the whole history of the variable. """
+        return self[:]
+
+
+def history_name(variable: Variable) -> str:
+    return variable.component_name + " :: " + variable.name
@@ -1,3 +1,7 @@
+import atexit
+import contextvars
+import weakref
+
 start_message = """
                                                 #######                               
                                          #####################                        
@@ -32,64 +36,214 @@ start_message = """
                         
 """
 
+class Logger:
+    """ Log of one run, written to the console and to aardvark.log in the
+    output folder of the run.
+
+    The log file is kept open with a buffer and flushed on errors, on flush,
+    on close and when the interpreter exits, instead of being opened for
+    every message.
+
+    Messages below level are dropped. Iteration tables of the coupling
+    solves are logged at DEBUG, so set_level("info") leaves them out. In
+    quiet mode only warnings and errors are printed to the console, and the
+    log file still gets every message at or above level.
+
+    Attributes
+    ----------
+    case_name : str
+        Name of the case, "" for a logger without a log file.
+
+    output_dir : str
+        Folder of the case the log file and other outputs are written to,
+        None for a logger without a log file.
+
+    """
+
+    DEBUG = 10
+    INFO = 20
+    WARNING = 30
+    ERROR = 40
+
+    level_names = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+
+    buffer_size = 1 << 16
+
+    def __init__(self, case_name: str = "", output_dir: str = None, level: int = DEBUG, quiet: bool = False):
+        self.case_name = case_name
+        self.output_dir = output_dir
+
+        self.level = level
+        self.quiet = quiet
+
+        self._file = None
+
+        if(output_dir is not None):
+            self._create_log_file()
+
+            open_loggers.add(self)
+
+    def set_level(self, level):
+        """ level is one of Logger.DEBUG, INFO, WARNING and ERROR or its
+        name.
+        """
+        if(isinstance(level, str)):
+            if(level.lower() not in self.level_names):
+                self.error("Unknown log level \"" + level + "\". Options are " + ", ".join("\"" + name + "\"" for name in self.level_names) + ".")
+
+            level = self.level_names[level.lower()]
+
+        self.level = level
+
+    def set_quiet(self, quiet: bool = True):
+        self.quiet = quiet
+
+    def debug(self, message: str):
+        self._write("AARDVARK :: " + message + "\n", self.DEBUG)
+
+    def message(self, message: str):
+        self._write("AARDVARK :: " + message + "\n", self.INFO)
+
+    def warning(self, message: str):
+        self._write("AARDVARK :: WARNING :: " + message + "\n", self.WARNING)
+
+    def line_break(self):
+        self._write("\n", self.INFO)
+
+    def error(self, message: str):
+        message = "AARDVARK :: ERROR :: " + message
+
+        self._write(message + "\n", self.ERROR)
+        self.flush()
+        
+        raise Exception(message + "\n")
+
+    def hanging_message(self, message: str):
+        self._write("AARDVARK :: " + message, self.INFO)
+
+    def end_of_hanging_message(self, message: str):
+        self._write(message + "\n", self.INFO)
+
+    def flush(self):
+        if(self._file is not None):
+            self._file.flush()
+
+    def close(self):
+        if(self._file is not None):
+            self._file.close()
+            self._file = None
+
+    def _write(self, message: str, level: int):
+        if(level < self.level):
+            return
+
+        if(not self.quiet or level >= self.WARNING):
+            print(message, end="")
+
+        # Loggers without a case only write to the console.
+        if(self._file is not None):
+            self._file.write(message)
+    
+    def _create_log_file(self):
+        self._file = open(self.output_dir + "/aardvark.log", "w", buffering=self.buffer_size)
+        self._file.write(start_message)
+
+        self.message("Welcome to AARDVARK!")
+        self.line_break()
+
+
+# Loggers with an open log file, closed at exit.
+open_loggers = weakref.WeakSet()
+
+@atexit.register
+def close_open_loggers():
+    for logger in list(open_loggers):
+        logger.close()
+
+
 class Log:
-    case_name = ""
+    """ Logs to the logger of the current run.
+
+    Each run, e.g. a TransientSolver.solve, sets its own logger in its own
+    context, so runs on different threads of one process log to their own
+    case. Outside of a run the logger set by the last create in the same
+    context is used, and otherwise a logger that only prints.
+    """
+
+    DEBUG = Logger.DEBUG
+    INFO = Logger.INFO
+    WARNING = Logger.WARNING
+    ERROR = Logger.ERROR
+
+    _default = Logger()
+    _current = contextvars.ContextVar("aardvark_logger", default=None)
 
     @classmethod
-    def create(cls, case_name: str):
-        cls.case_name = case_name
+    def logger(cls) -> Logger:
+        logger = cls._current.get()
 
-        cls._create_log_file()
+        return logger if logger is not None else cls._default
 
     @classmethod
-    def message(cls, message: str):
-        message = "AARDVARK :: " + message
+    def use(cls, logger: Logger):
+        """ Makes logger the logger of the current context. """
+        cls._current.set(logger)
+
+    @classmethod
+    def create(cls, case_name: str) -> Logger:
+        """ Creates the logger of the case in output/<case_name> and uses it
+        in the current context.
+        """
+        logger = Logger(case_name, "output/" + case_name, cls.logger().level, cls.logger().quiet)
 
-        print(message)
+        cls.use(logger)
 
-        message = message + "\n"
-        cls._add_to_log_file(message)
+        return logger
 
     @classmethod
-    def line_break(cls):
-        print("")
+    def output_dir(cls) -> str:
+        return cls.logger().output_dir
 
-        cls._add_to_log_file("\n")
+    @classmethod
+    def set_level(cls, level):
+        cls.logger().set_level(level)
 
     @classmethod
-    def error(cls, message: str):
-        message = "AARDVARK :: ERROR :: " + message
+    def set_quiet(cls, quiet: bool = True):
+        cls.logger().set_quiet(quiet)
 
-        print(message)
-        
-        message = message + "\n"
-        cls._add_to_log_file(message)
-        
-        raise Exception(message)
+    @classmethod
+    def debug(cls, message: str):
+        cls.logger().debug(message)
 
     @classmethod
-    def hanging_message(cls, message: str):
-        message = "AARDVARK :: " + message
+    def message(cls, message: str):
+        cls.logger().message(message)
+
+    @classmethod
+    def warning(cls, message: str):
+        cls.logger().warning(message)
+
+    @classmethod
+    def line_break(cls):
+        cls.logger().line_break()
 
-        print(message, end="")
+    @classmethod
+    def error(cls, message: str):
+        cls.logger().error(message)
 
-        cls._add_to_log_file(message)
+    @classmethod
+    def hanging_message(cls, message: str):
+        cls.logger().hanging_message(message)
 
     @classmethod
     def end_of_hanging_message(cls, message: str):
-        print(message)
+        cls.logger().end_of_hanging_message(message)
 
-        cls._add_to_log_file(message)
-    
     @classmethod
-    def _create_log_file(cls):
-        with open("output/" + cls.case_name + "/aardvark.log", "w") as file:
-            file.write(start_message)
-
-        cls.message("Welcome to AARDVARK!")
-        cls.line_break()
+    def flush(cls):
+        cls.logger().flush()
 
     @classmethod
-    def _add_to_log_file(cls, message: str):
-        with open("output/" + cls.case_name + "/aardvark.log", "a") as file:
-            file.write(message)
\ No newline at end of file
+    def close(cls):
+        cls.logger().close()
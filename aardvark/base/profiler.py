@@ -0,0 +1,229 @@
+from aardvark.base.fluid import Fluid
+
+import csv
+import json
+import threading
+import time
+
+import numpy as np
+
+
+def unwrap(fluid: Fluid) -> Fluid:
+    return fluid
+
+
+class ProfiledFluid(Fluid):
+    """ Wraps a fluid and counts the calls, evaluated states and time of
+    each of its property methods in a Profiler.
+
+    A ProfiledFluid pickles as the fluid it wraps, so components sent to
+    worker processes leave the profiler and its lock behind and are not
+    profiled there.
+    """
+
+    def __init__(self, fluid: Fluid, profiler):
+        self.fluid = fluid
+        self.fluid_name = getattr(fluid, "fluid_name", "")
+
+        self.profiler = profiler
+
+    def __reduce__(self):
+        return (unwrap, (self.fluid,))
+
+    def _timed(self, method: str, x1, x2, *args):
+        start = time.perf_counter()
+        value = getattr(self.fluid, method)(x1, x2, *args)
+        seconds = time.perf_counter() - start
+
+        self.profiler.add_fluid_call(self.fluid_name + "." + method, seconds, max(np.size(x1), np.size(x2)))
+
+        return value
+
+    def rho_from_T_P(self, T: float, P: float) -> float:
+        return self._timed("rho_from_T_P", T, P)
+
+    def cp_from_T_P(self, T: float, P: float) -> float:
+        return self._timed("cp_from_T_P", T, P)
+
+    def mu_from_T_P(self, T: float, P: float) -> float:
+        return self._timed("mu_from_T_P", T, P)
+
+    def k_from_T_P(self, T: float, P: float) -> float:
+        return self._timed("k_from_T_P", T, P)
+
+    def e_from_T_P(self, T: float, P: float) -> float:
+        return self._timed("e_from_T_P", T, P)
+
+    def T_from_e_P(self, e: float, P: float) -> float:
+        return self._timed("T_from_e_P", e, P)
+
+    def T_from_e_P_guess(self, e: float, P: float, T_guess: float) -> float:
+        return self._timed("T_from_e_P_guess", e, P, T_guess)
+
+    def e_dedT_from_T_P(self, T: float, P: float) -> tuple:
+        return self._timed("e_dedT_from_T_P", T, P)
+
+    def state_from_T_P(self, T: float, P: float) -> np.ndarray:
+        return self._timed("state_from_T_P", T, P)
+
+
+class Profiler:
+    """ Collects where the time of a run goes.
+
+    A System with a profiler times every component solve and adds up the
+    counters the component reports through get_profile_counters, e.g. the
+    iterations at each node of a FlowChannel1D. attach wraps the fluid of
+    every component in a ProfiledFluid that counts and times the property
+    calls. TransientSolver adds one entry per attempted time step with its
+    coupling sweeps and wall time.
+
+    Without a profiler the System only checks for one, so profiling costs
+    nothing when it is off. Components solved in worker processes are not
+    profiled.
+
+    Attributes
+    ----------
+    components : dict
+        Calls, time and summed counters of the solves of each component.
+
+    fluid_calls : dict
+        Calls, evaluated states and time of each fluid method.
+
+    steps : list[dict]
+        Time, dt, result, coupling sweeps and wall time of each attempted
+        time step.
+
+    """
+
+    def __init__(self):
+        self.components = {}
+        self.fluid_calls = {}
+        self.steps = []
+
+        self._wrapped = []
+        self._lock = threading.Lock()
+
+    def solve(self, component, dt: float):
+        """ Solves component and records its time and counters. """
+        start = time.perf_counter()
+        component.solve(dt)
+        seconds = time.perf_counter() - start
+
+        counters = component.get_profile_counters()
+
+        with self._lock:
+            self.add_solve(component, seconds, counters)
+
+    def add_solve(self, component, seconds: float, counters: dict):
+        record = self.components.get(component.name)
+
+        if(record is None):
+            record = {"type": component.component_type, "calls": 0, "time": 0.0, "counters": {}}
+            self.components[component.name] = record
+
+        record["calls"] += 1
+        record["time"] += seconds
+
+        # Counters ending in _max keep the maximum, the others are summed.
+        for name, value in counters.items():
+            if(name.endswith("_max")):
+                record["counters"][name] = max(record["counters"].get(name, value), value)
+
+            else:
+                record["counters"][name] = record["counters"].get(name, 0) + value
+
+    def array_counters(self) -> set:
+        return set(name for record in self.components.values() for name, value in record["counters"].items()
+                   if isinstance(value, np.ndarray))
+
+    def add_fluid_call(self, method: str, seconds: float, states: int):
+        with self._lock:
+            record = self.fluid_calls.get(method)
+
+            if(record is None):
+                record = {"calls": 0, "states": 0, "time": 0.0}
+                self.fluid_calls[method] = record
+
+            record["calls"] += 1
+            record["states"] += states
+            record["time"] += seconds
+
+    def attach(self, components: list):
+        """ Wraps the fluid of every component that has one. Components
+        sharing a fluid share its wrapper.
+        """
+        wrappers = {}
+
+        for component in components:
+            fluid = getattr(component, "fluid", None)
+
+            if(not isinstance(fluid, Fluid) or isinstance(fluid, ProfiledFluid)):
+                continue
+
+            if(id(fluid) not in wrappers):
+                wrappers[id(fluid)] = ProfiledFluid(fluid, self)
+
+            component.fluid = wrappers[id(fluid)]
+            self._wrapped.append((component, fluid))
+
+    def detach(self):
+        """ Puts back the fluids replaced by attach. """
+        for component, fluid in self._wrapped:
+            component.fluid = fluid
+
+        self._wrapped = []
+
+    def to_dict(self) -> dict:
+        components = {name: dict(record, counters={key: value.tolist() if isinstance(value, np.ndarray) else value
+                                                   for key, value in record["counters"].items()})
+                      for name, record in self.components.items()}
+
+        return {"components": components, "fluid_calls": self.fluid_calls, "steps": self.steps}
+
+    def summary(self) -> list:
+        """ Returns text lines of the components and fluid methods sorted
+        by time.
+        """
+        lines = ["%-24s %-16s %-8s %-12s %s" % ("Component", "Type", "Solves", "Time [s]", "Counters")]
+
+        for name, record in sorted(self.components.items(), key=lambda item: -item[1]["time"]):
+            # Array counters are too long for a line and are in the JSON.
+            counters = ", ".join(key + " = " + str(value) for key, value in record["counters"].items()
+                                 if not isinstance(value, np.ndarray))
+            lines.append("%-24s %-16s %-8i %-12.6f %s" % (name, record["type"], record["calls"], record["time"], counters))
+
+        if(self.fluid_calls):
+            lines.append("")
+            lines.append("%-40s %-10s %-12s %s" % ("Fluid method", "Calls", "States", "Time [s]"))
+
+            for name, record in sorted(self.fluid_calls.items(), key=lambda item: -item[1]["time"]):
+                lines.append("%-40s %-10i %-12i %.6f" % (name, record["calls"], record["states"], record["time"]))
+
+        return lines
+
+    def write(self, path: str):
+        """ Writes the profile to path + ".json" and a flat table of it to
+        path + ".csv". For time steps, calls is the number of coupling
+        sweeps. Array counters, e.g. the node_iterations_per_node of a
+        FlowChannel1D, are only written to the JSON.
+        """
+        with open(path + ".json", "w") as file:
+            json.dump(self.to_dict(), file, indent=1)
+
+        array_counters = self.array_counters()
+
+        counter_names = sorted(set(key for record in self.components.values() for key in record["counters"]) - array_counters)
+
+        with open(path + ".csv", "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["section", "name", "calls", "states", "time [s]"] + counter_names)
+
+            for name, record in self.components.items():
+                writer.writerow(["component", name, record["calls"], "", record["time"]]
+                                + [record["counters"].get(key, "") for key in counter_names])
+
+            for name, record in self.fluid_calls.items():
+                writer.writerow(["fluid", name, record["calls"], record["states"], record["time"]] + [""]*len(counter_names))
+
+            for n, step in enumerate(self.steps):
+                writer.writerow(["step", n, step["sweeps"], "", step["wall_time"]] + [""]*len(counter_names))
@@ -0,0 +1,35 @@
+import numpy as np
+
+
+class StateBuffer:
+    """ Contiguous storage of the values of every variable of a System.
+
+    Each variable owns a slice of values and the same slice of prev_values
+    and keeps views of them, so the residual of the whole System is one
+    array operation.
+
+    Attributes
+    ----------
+    values, prev_values : np.ndarray
+        Current and previous values of every variable, flattened.
+
+    version : int
+        Incremented whenever a variable changes which slice it uses, so the
+        owner of the buffer knows to rebuild its indices.
+
+    """
+
+    def __init__(self, size: int):
+        self.values = np.zeros(size)
+        self.prev_values = np.zeros(size)
+
+        self.version = 0
+
+    def view(self, offset: int, shape: tuple) -> tuple:
+        """ Returns the views of values and prev_values of the given shape
+        starting at offset.
+        """
+        size = int(np.prod(shape))
+
+        return (self.values[offset:offset + size].reshape(shape),
+                self.prev_values[offset:offset + size].reshape(shape))
@@ -1,107 +1,841 @@
 from aardvark.base.component import Component
-from aardvark.base.variables import Variable
+from aardvark.base.variables import Variable, Mesh1DVar
 from aardvark.base.fluid import Fluid
-from aardvark.base.log import Log
-
+from aardvark.base.log import Log, Logger
+from aardvark.base.acceleration import create_accelerator
+from aardvark.base.state_buffer import StateBuffer
+from aardvark.base import checkpoint
+from aardvark.mesh.transfer import Transfer, kinds as transfer_kinds
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import contextvars
+import heapq
+import numpy as np
 import os
 from decimal import Decimal
 
 
+# Fluids of the components solved in a worker process, by the id of the
+# fluid in the main process. The pool lives for the whole run, so state a
+# fluid builds in the worker, e.g. the InverseEOS of Hydrogen or the entries
+# of a CachedFluid, is kept from one time step to the next.
+worker_fluids = {}
+
+def solve_in_worker(component: Component, dt: float, fluid_key: int) -> tuple:
+    # Runs in a worker process on a pickled copy of the component.
+    if(fluid_key is not None):
+        component.fluid = worker_fluids.setdefault(fluid_key, component.fluid)
+
+    component.solve(dt)
+
+    return component.get_worker_result()
+
+
+
 class System:
     @classmethod
-    def create_outputs_dir(cls, desired_case_name: str):
+    def create_outputs_dir(cls, desired_case_name: str) -> Logger:
+        """ Creates the folder of a case in output/ and the logger of the
+        case, and uses the logger in the current context. If the case
+        already exists a free name is taken by adding -1, -2 and so on. The
+        folder is created atomically, so runs started at the same time get
+        different folders.
+        """
         outputs_dir_exists = os.path.isdir("output")
 
-        if(not outputs_dir_exists):
-            os.mkdir("output")
+        os.makedirs("output", exist_ok=True)
 
-        case_exists = os.path.isdir("output/" + desired_case_name)
+        case_name = desired_case_name
 
-        if(case_exists):
-            case_name = cls.modify_case_name(desired_case_name)
+        i = 0
 
-        else:
-            case_name = desired_case_name
+        while(True):
+            try:
+                os.mkdir("output/" + case_name)
+                break
 
-        os.mkdir("output/" + case_name)
+            except FileExistsError:
+                i += 1
+                case_name = desired_case_name + "-" + str(i)
         
-        Log.create(case_name)
+        logger = Log.create(case_name)
 
         if(not outputs_dir_exists):
             Log.message("Output folder not found. Created new outputs folder.")
 
-        if(case_exists):
+        if(case_name != desired_case_name):
             Log.message("A case named \"" + desired_case_name + "\" already exists. Modifying case name to \"" + case_name + "\".")
             
         Log.message("Created case named \"" + str(case_name) + "\".")
 
-    @classmethod
-    def modify_case_name(cls, orig_case_name: str) -> str:
-        i = 0
-
-        new_case_name = orig_case_name
-
-        while(os.path.isdir("output/" + new_case_name)):
-            i += 1
-            new_case_name = orig_case_name + "-" + str(i)
-
-        return new_case_name
+        return logger
     
-    def __init__(self):
+    def __init__(self, execution: str = "gauss-seidel", workers: int = None, pool: str = "thread",
+                 skip_tol: float = None):
+        """ execution is "gauss-seidel" to solve components one after the
+        other using the newest values, or "jacobi" to solve components that
+        do not depend on each other in the current sweep at the same time on
+        a pool of workers. pool is "thread" or "process" and workers is the
+        size of the pool, by default the number of CPUs. The pool is kept
+        from one solve to the next until close is called, which
+        TransientSolver does at the end of a run.
+
+        When skip_tol is set, sweeps over coupled components skip every
+        component whose connected inputs changed by less than skip_tol
+        relative since it was last solved, and keep its outputs. A skipped
+        component adds nothing to the residual, so skip_tol bounds the
+        accuracy of the coupled solution and should be well below the
+        relative accuracy wanted.
+        """
+        if(execution not in ("gauss-seidel", "jacobi")):
+            Log.error("Unknown execution \"" + str(execution) + "\". Options are \"gauss-seidel\" and \"jacobi\".")
+
+        if(pool not in ("thread", "process")):
+            Log.error("Unknown pool \"" + str(pool) + "\". Options are \"thread\" and \"process\".")
+
+        self.execution = execution
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.pool = pool
+        self.skip_tol = skip_tol
+
+        self._executor = None
+
+        # Set to a Profiler to time the component solves.
+        self.profiler = None
+
         self._components: list[Component] = []
         self._connections: list[tuple] = []
 
+        # Components by name and connections by id of their target.
+        self._components_by_name: dict[str, Component] = {}
+        self._connections_by_target: dict[int, tuple] = {}
+
+        # Kind of transfer of the connections made with one, by id of their
+        # target.
+        self._transfers: dict[int, str] = {}
+
+        # Connections into each component by component name. Built by setup.
+        self._update_plan: dict[str, list[tuple]] = None
+
+        # One entry per solve of a group of coupled components.
+        self.convergence_history: list[dict] = []
+
+        # (components, is_cycle) for each strongly connected group of
+        # components in topological order, and the groups split into levels
+        # that only depend on earlier levels. Built by setup.
+        self._schedule: list[tuple] = None
+        self._levels: list[list[tuple]] = None
+
+        # Values of every variable, and the buffer index and component
+        # number of every element the residual is summed over. Built by
+        # setup.
+        self._state: StateBuffer = None
+        self._residual_index: np.ndarray = None
+        self._residual_component: np.ndarray = None
+        self._residual_version: int = None
+        self._component_numbers: dict[str, int] = None
+
     def add_component(self, component: Component):
-        for _component in self._components:
-            if _component.name == component.name:
-                Log.error("Tried to add \"" + component.name + "\" to system but a component with that name already exists.")
+        if(component.name in self._components_by_name):
+            Log.error("Tried to add \"" + component.name + "\" to system but a component with that name already exists.")
 
         self._components.append(component)
+        self._components_by_name[component.name] = component
+
+        self._update_plan = None
+        self._schedule = None
+        self._state = None
+
+    def build_update_plan(self):
+        self._update_plan = {component.name: [] for component in self._components}
+
+        for source, target in self._connections:
+            if(target.component_name not in self._update_plan):
+                Log.error(target.component_name + " :: " + target.name + " is connected but \"" + target.component_name + "\" has not been added to the system.")
+
+            if(source.component_name not in self._update_plan):
+                Log.error(source.component_name + " :: " + source.name + " is connected but \"" + source.component_name + "\" has not been added to the system.")
+
+            self._update_plan[target.component_name].append((source, target))
+
+            if(id(target) in self._transfers):
+                target.transfer = Transfer(self._transfers[id(target)], source.mesh, source.var_type, target.mesh, target.var_type)
+
+                shape = np.shape(source.initial)[:-1] + (target.transfer.matrix.shape[0],)
+
+                if(shape != np.shape(target.initial)):
+                    Log.error("Transfer from " + source.component_name + " :: " + source.name + " gives values of shape " + str(shape) + " but " + target.component_name + " :: " + target.name + " has shape " + str(np.shape(target.initial)) + ".")
 
     def update_connections_for(self, component: Component):
         source: Variable
         target: Variable
 
-        for source, target in self._connections:
-            if target.component_name == component.name:
+        for source, target in self._update_plan[component.name]:
+            # Aliased targets already hold the value of their source.
+            if(target.alias_of is not source):
                 target.update_from(source)
 
-    def solve(self, dt: float, tol: float, max_iter: float):
-        # Do initial solve.
-        for component in self._components:
+    def prepare(self):
+        """ Builds whatever the connections changed since setup. """
+        if(self._update_plan is None):
+            self.build_update_plan()
+
+        if(self._schedule is None):
+            self.build_schedule()
+
+        if(self._state is None):
+            self.allocate_state()
+
+    def solve(self, dt: float, tol: float, max_iter: float, accel: str = None) -> bool:
+        """ Solves one time step. Returns False if a group of coupled
+        components reached max_iter without converging.
+        """
+        self.prepare()
+
+        converged = True
+
+        if(self.execution == "jacobi"):
+            for level in self._levels:
+                # Components of a level only depend on earlier levels.
+                independent = [group[0] for group, is_cycle in level if not is_cycle]
+
+                for component in independent:
+                    self.update_connections_for(component)
+
+                self.solve_components(independent, dt)
+
+                for group, is_cycle in level:
+                    if(is_cycle):
+                        converged &= self.solve_cycle(group, dt, tol, max_iter, accel)
+
+        else:
+            for group, is_cycle in self._schedule:
+                if(is_cycle):
+                    converged &= self.solve_cycle(group, dt, tol, max_iter, accel)
+
+                # Every input of a component outside of a cycle is final
+                # once the groups before it are solved, so one solve is
+                # enough.
+                else:
+                    self.update_connections_for(group[0])
+                    self.solve_component(group[0], dt)
+
+        if(not any(is_cycle for _, is_cycle in self._schedule)):
+            Log.message("Time step solved in a single pass.")
+
+        return converged
+
+    def solve_components(self, components: list, dt: float):
+        """ Solves components that do not depend on each other, on the
+        worker pool when there is one. Each component only writes its own
+        variables, so the results do not depend on the number of workers,
+        unless the components share a CachedFluid with rtol > 0 (see
+        CachedFluid).
+        """
+        executor = self.executor() if len(components) > 1 else None
+
+        if(executor is None):
+            for component in components:
+                self.solve_component(component, dt)
+
+        elif(self.pool == "thread"):
+            # Worker threads log to the logger of the run that started them.
+            contexts = [contextvars.copy_context() for _ in components]
+
+            for _ in executor.map(lambda context, component: context.run(self.solve_component, component, dt), contexts, components):
+                pass
+
+        else:
+            fluid_keys = [id(component.fluid) if hasattr(component, "fluid") else None for component in components]
+
+            results = executor.map(solve_in_worker, components, [dt]*len(components), fluid_keys)
+
+            for component, result in zip(components, results):
+                component.set_worker_result(result)
+
+    def executor(self):
+        """ Returns the worker pool of jacobi execution, None if there is
+        none. The pool is started on first use and kept until close, so
+        worker processes are only started once per run.
+        """
+        if(self._executor is None and self.execution == "jacobi" and self.workers > 1):
+            if(self.pool == "thread"):
+                self._executor = ThreadPoolExecutor(self.workers)
+
+            else:
+                self._executor = ProcessPoolExecutor(self.workers)
+
+        return self._executor
+
+    def close(self):
+        """ Shuts down the worker pool. The next solve starts a new one. """
+        if(self._executor is not None):
+            self._executor.shutdown()
+            self._executor = None
+
+    def solve_component(self, component: Component, dt: float):
+        if(self.profiler is None):
             component.solve(dt)
 
-        res = self.residual()
+        else:
+            self.profiler.solve(component, dt)
+
+    def sweep_schedule(self, dt: float):
+        """ Updates and solves every component once in schedule order. """
+        for group, _ in self._schedule:
+            self.sweep(group, dt)
+
+    def sweep(self, group: list, dt: float, skip: bool = False, keep: set = ()) -> int:
+        """ Updates and solves every component of a group once. With skip,
+        components whose inputs are clean are not solved, unless their name
+        is in keep. Returns the number of skipped components.
+        """
+        skipped = 0
+
+        if(self.execution == "jacobi"):
+            # Every input is taken from the end of the previous sweep before
+            # any component of the group is solved.
+            solved = []
+
+            for component in group:
+                self.update_connections_for(component)
+
+                if(skip and self.inputs_are_clean(component) and component.name not in keep):
+                    self.skip_component(component)
+                    skipped += 1
+
+                else:
+                    solved.append(component)
+
+            self.solve_components(solved, dt)
+
+            for component in solved:
+                self.mark_inputs_clean(component)
+
+        else:
+            for component in group:
+                self.update_connections_for(component)
+
+                if(skip and self.inputs_are_clean(component) and component.name not in keep):
+                    self.skip_component(component)
+                    skipped += 1
+
+                else:
+                    self.solve_component(component, dt)
+                    self.mark_inputs_clean(component)
+
+        return skipped
+
+    def inputs_are_clean(self, component: Component) -> bool:
+        for _, target in self._update_plan[component.name]:
+            if(target.is_dirty(self.skip_tol)):
+                return False
+
+        return True
+
+    def mark_inputs_clean(self, component: Component):
+        for _, target in self._update_plan[component.name]:
+            target.mark_clean()
+
+    def skip_component(self, component: Component):
+        # The outputs are kept from the last solve. They did not change, so
+        # they add nothing to the residual.
+        variable: Variable
+        for variable in component.variables.values():
+            if(variable.alias_of is None):
+                variable.prev_value = variable.value
+
+    def solve_cycle(self, group: list, dt: float, tol: float, max_iter: float, accel: str = None) -> bool:
+        accelerator = create_accelerator(accel)
+        tears = self.tear_sources(group)
+
+        # Tear values set by an accelerator are not what their component
+        # would output, so their components are never skipped.
+        skip = self.skip_tol is not None
+        keep = set(tear.component_name for tear in tears) if accelerator.name != "none" else set()
+
+        # Do initial solve.
+        self.sweep(group, dt)
+
+        res = self.group_residual(group)
+
+        history = {"components": [component.name for component in group], "accel": accelerator.name,
+                   "residuals": [res], "converged": False, "skipped": 0}
+        self.convergence_history.append(history)
 
         Log.line_break()
-        Log.message("     %-9s     %-12s" % ("Iteration", "Residual"))
-        Log.message("     %-9s     %-12E" % ("Initial", Decimal(res)))
+        Log.message("Iterating coupled components: " + ", ".join(component.name for component in group))
+        Log.debug("     %-9s     %-12s" % ("Iteration", "Residual"))
+        Log.debug("     %-9s     %-12E" % ("Initial", Decimal(res)))
+
+        # Accelerators work on the tear values scaled by their magnitude
+        # after the initial solve.
+        x = self.get_values(tears)
+        scale = np.where(np.abs(x) > 0, np.abs(x), 1)
 
         i = 0
 
         while(True):
             if(i >= max_iter):
-                Log.message("Max iterations reached without convergence.")
+                Log.warning("Max iterations reached without convergence.")
                 break
 
-            for component in self._components:
-                self.update_connections_for(component)
-                component.solve(dt)
+            history["skipped"] += self.sweep(group, dt, skip, keep)
 
-            res = self.residual()
+            res = self.group_residual(group)
+            history["residuals"].append(res)
 
-            Log.message("     %-9i     %-12E" % (i, Decimal(res)))
+            Log.debug("     %-9i     %-12E" % (i, Decimal(res)))
 
             if(res <= tol):
-                Log.message("Time step converged in " + str(i) + " iterations.")
+                Log.message("Coupled components converged in " + str(i) + " iterations.")
+                history["converged"] = True
                 break
 
+            g = self.get_values(tears)
+
+            if(tears and accelerator.name != "none"):
+                x = accelerator.update(x/scale, g/scale)*scale
+
+                self.relax_values(tears, x)
+
+            else:
+                x = g
+
             i += 1
-    
+
+        return history["converged"]
+
+    def tear_sources(self, group: list) -> list:
+        """ Returns the source variables of the connections that close the
+        loops of a group of coupled components. These are the connections
+        whose target reads a value from the previous sweep: those whose
+        source is solved at or after their target in the group, or every
+        connection inside the group for jacobi execution.
+        """
+        if(self.execution == "jacobi"):
+            position = {component.name: 0 for component in group}
+
+        else:
+            position = {component.name: n for n, component in enumerate(group)}
+
+        tears = []
+        tear_ids = set()
+
+        for component in group:
+            for source, target in self._update_plan[component.name]:
+                if(source.component_name in position and position[source.component_name] >= position[target.component_name]
+                   and id(source) not in tear_ids):
+                    tears.append(source)
+                    tear_ids.add(id(source))
+
+        return tears
+
+    def get_values(self, variables: list) -> np.ndarray:
+        if(not variables):
+            return np.zeros(0)
+
+        return np.concatenate([np.ravel(variable.value) for variable in variables]).astype(float)
+
+    def relax_values(self, variables: list, x: np.ndarray):
+        start = 0
+
+        for variable in variables:
+            size = np.size(variable.value)
+
+            variable.relax(np.reshape(x[start:start + size], np.shape(variable.value)))
+
+            start += size
+
+    def convergence_report(self) -> str:
+        """ Returns a text table of the sweeps, skipped component solves and
+        residuals of every solve of a group of coupled components so far.
+        """
+        lines = ["%-6s %-14s %-8s %-8s %-14s %-14s %s" % ("Solve", "Accel", "Sweeps", "Skipped", "Initial Res", "Final Res", "Components")]
+
+        for n, history in enumerate(self.convergence_history):
+            residuals = history["residuals"]
+            sweeps = str(history.get("sweeps", len(residuals))) + ("" if history["converged"] else "*")
+
+            lines.append("%-6i %-14s %-8s %-8i %-14.6E %-14.6E %s" % (n, history["accel"], sweeps, history["skipped"],
+                                                                      residuals[0], residuals[-1], ", ".join(history["components"])))
+
+        if(not all(history["converged"] for history in self.convergence_history)):
+            lines.append("* did not converge")
+
+        return "\n".join(lines)
+
+    def build_schedule(self):
+        """ Orders the components for solve.
+
+        Each connection is an edge from the component of its source to the
+        component of its target. Strongly connected groups of the graph
+        (feedback loops) are found with Tarjan's algorithm and the groups are
+        ordered topologically, breaking ties by the order the components were
+        added in. Within a group components are ordered so that few of the
+        connections inside the group point backwards, see order_group.
+        """
+        index = {component.name: n for n, component in enumerate(self._components)}
+
+        edges = [[] for _ in self._components]
+        edge_set = set()
+        self_loops = set()
+
+        source: Variable
+        target: Variable
+        for source, target in self._connections:
+            i = index[source.component_name]
+            j = index[target.component_name]
+
+            if(i == j):
+                self_loops.add(i)
+
+            elif((i, j) not in edge_set):
+                edges[i].append(j)
+                edge_set.add((i, j))
+
+        groups = self.strongly_connected_groups(edges)
+
+        # Topological order of the groups (Kahn's algorithm). The ready group
+        # holding the earliest added component goes first.
+        group_of = {}
+        for g, group in enumerate(groups):
+            for n in group:
+                group_of[n] = g
+
+        group_edges = [set() for _ in groups]
+        n_inputs = [0 for _ in groups]
+
+        for i, targets in enumerate(edges):
+            for j in targets:
+                if(group_of[i] != group_of[j] and group_of[j] not in group_edges[group_of[i]]):
+                    group_edges[group_of[i]].add(group_of[j])
+                    n_inputs[group_of[j]] += 1
+
+        ready = [(groups[g][0], g) for g in range(len(groups)) if n_inputs[g] == 0]
+        heapq.heapify(ready)
+
+        self._schedule = []
+        self._levels = []
+
+        # Level of each group: one more than the highest level feeding it.
+        level = [0 for _ in groups]
+
+        while(ready):
+            _, g = heapq.heappop(ready)
+
+            group = [self._components[n] for n in self.order_group(groups[g], edges)]
+            is_cycle = len(group) > 1 or groups[g][0] in self_loops
+
+            self._schedule.append((group, is_cycle))
+
+            if(level[g] == len(self._levels)):
+                self._levels.append([])
+
+            self._levels[level[g]].append((group, is_cycle))
+
+            for h in group_edges[g]:
+                level[h] = max(level[h], level[g] + 1)
+                n_inputs[h] -= 1
+
+                if(n_inputs[h] == 0):
+                    heapq.heappush(ready, (groups[h][0], h))
+
+    @staticmethod
+    def order_group(group: list, edges: list) -> list:
+        """ Orders the nodes of a strongly connected group for Gauss-Seidel
+        sweeps. Each step takes the node with the fewest inputs from nodes of
+        the group that are not ordered yet, breaking ties by node number.
+        Connections from later to earlier nodes read values of the previous
+        sweep, so fewer of them means fewer lagged values to iterate on.
+        """
+        members = set(group)
+
+        n_inputs = {n: 0 for n in group}
+        for i in group:
+            for j in edges[i]:
+                if(j in members):
+                    n_inputs[j] += 1
+
+        heap = [(n_inputs[n], n) for n in group]
+        heapq.heapify(heap)
+
+        ordered = []
+        done = set()
+
+        while(heap):
+            count, n = heapq.heappop(heap)
+
+            # Skip entries made stale by a later decrement.
+            if(n in done or count != n_inputs[n]):
+                continue
+
+            ordered.append(n)
+            done.add(n)
+
+            for j in edges[n]:
+                if(j in members and j not in done):
+                    n_inputs[j] -= 1
+                    heapq.heappush(heap, (n_inputs[j], j))
+
+        return ordered
+
+    @staticmethod
+    def strongly_connected_groups(edges: list) -> list:
+        """ Tarjan's algorithm, iterative so that long chains do not hit the
+        recursion limit. edges[i] lists the nodes node i points to. Returns
+        the groups as sorted lists of nodes.
+        """
+        n_nodes = len(edges)
+
+        order = [None]*n_nodes
+        low_link = [0]*n_nodes
+        on_stack = [False]*n_nodes
+
+        stack = []
+        groups = []
+        counter = 0
+
+        for root in range(n_nodes):
+            if(order[root] is not None):
+                continue
+
+            work = [(root, 0)]
+
+            while(work):
+                node, k = work.pop()
+
+                if(k == 0):
+                    order[node] = counter
+                    low_link[node] = counter
+                    counter += 1
+
+                    stack.append(node)
+                    on_stack[node] = True
+
+                # Resume the walk over the edges of node.
+                recursed = False
+
+                while(k < len(edges[node])):
+                    child = edges[node][k]
+                    k += 1
+
+                    if(order[child] is None):
+                        work.append((node, k))
+                        work.append((child, 0))
+                        recursed = True
+                        break
+
+                    elif(on_stack[child]):
+                        low_link[node] = min(low_link[node], order[child])
+
+                if(recursed):
+                    continue
+
+                if(low_link[node] == order[node]):
+                    group = []
+
+                    while(True):
+                        member = stack.pop()
+                        on_stack[member] = False
+                        group.append(member)
+
+                        if(member == node):
+                            break
+
+                    groups.append(sorted(group))
+
+                if(work):
+                    parent = work[-1][0]
+                    low_link[parent] = min(low_link[parent], low_link[node])
+
+        return groups
+
+    @property
+    def components(self) -> list:
+        return self._components
+
+    def all_variables(self) -> list:
+        """ Returns the variables of every component in the order the
+        components were added.
+        """
+        return [variable for component in self._components for variable in component.variables.values()]
+
+    def allocate_state(self):
+        """ Stores the values of every variable in one StateBuffer.
+
+        For gauss-seidel execution the target of a connection between
+        variables of the same shape is made an alias of its source, so that
+        it reads the value of its source without a copy. Writing a different
+        value to an alias target moves it back to its own slice, so the
+        source is never changed by its targets. Connections whose source is
+        itself a target and connections with a transfer are copied. Jacobi
+        execution needs targets to keep the values of the previous sweep, so
+        it never aliases.
+        """
+        variables = self.all_variables()
+
+        offsets = np.cumsum([0] + [np.size(variable.initial) for variable in variables])
+
+        self._state = StateBuffer(int(offsets[-1]))
+
+        variable: Variable
+        for variable, offset in zip(variables, offsets):
+            variable.bind(self._state, int(offset))
+
+        if(self.execution == "gauss-seidel"):
+            source: Variable
+            target: Variable
+            for source, target in self._connections:
+                if(id(source) in self._connections_by_target or target.transfer is not None):
+                    continue
+
+                if(np.shape(source.initial) == np.shape(target.initial)):
+                    target.alias(source)
+
+        self._residual_version = None
+
+    def build_residual_index(self):
+        index = []
+        component_number = []
+
+        for n, component in enumerate(self._components):
+            variable: Variable
+            for variable in component.variables.values():
+                size = np.size(variable.initial)
+
+                index.append(np.arange(variable.offset, variable.offset + size))
+                component_number.append(np.full(size, n))
+
+        self._residual_index = np.concatenate(index) if index else np.zeros(0, dtype=int)
+        self._residual_component = np.concatenate(component_number) if component_number else np.zeros(0, dtype=int)
+        self._residual_version = self._state.version
+
+        self._component_numbers = {component.name: n for n, component in enumerate(self._components)}
+
+    def component_residuals(self) -> np.ndarray:
+        """ Returns the residual of every component in the order they were
+        added, computed in one pass over the state buffer.
+        """
+        if(self._state is None):
+            return np.array([component.residual() for component in self._components])
+
+        if(self._residual_version != self._state.version):
+            self.build_residual_index()
+
+        d2 = (self._state.values - self._state.prev_values)**2
+
+        return np.sqrt(np.bincount(self._residual_component, weights=d2[self._residual_index], minlength=len(self._components)))
+
+    def get_state(self) -> np.ndarray:
+        """ Returns a copy of the values of every variable. """
+        return np.copy(self._state.values)
+
+    def set_state(self, x: np.ndarray, prev_x: np.ndarray = None):
+        """ Sets the values of every variable from an array returned by
+        get_state, and their prev_value from prev_x if given.
+        """
+        self._state.values[...] = x
+
+        if(prev_x is not None):
+            self._state.prev_values[...] = prev_x
+
+    def save_checkpoint(self, path: str, solver_state: dict = None):
+        """ Writes the value, prev_value and initial of every variable, the
+        checkpoint state of every component, the convergence history and
+        solver_state to a compressed npz file at path.
+
+        solver_state holds whatever the caller needs to resume, e.g. the
+        time and step of a TransientSolver, and is returned by
+        load_checkpoint. It may hold arrays, scalars, strings and None in
+        dicts and lists.
+        """
+        arrays = {}
+
+        components = {}
+        for component in self._components:
+            variables = {}
+
+            variable: Variable
+            for name, variable in component.variables.items():
+                key = component.name + "/" + name
+
+                variables[name] = {"value": checkpoint.encode(variable.value, "value/" + key, arrays),
+                                   "prev_value": checkpoint.encode(variable.prev_value, "prev_value/" + key, arrays),
+                                   "initial": checkpoint.encode(variable.initial, "initial/" + key, arrays)}
+
+            components[component.name] = {"variables": variables,
+                                          "state": checkpoint.encode(component.get_checkpoint_state(), "state/" + component.name, arrays)}
+
+        layout = {"components": components,
+                  "convergence_history": checkpoint.encode(self.convergence_history, "convergence_history", arrays),
+                  "solver_state": checkpoint.encode(solver_state, "solver_state", arrays)}
+
+        checkpoint.write(path, layout, arrays)
+
+    def load_checkpoint(self, path: str) -> dict:
+        """ Restores a checkpoint written by save_checkpoint into a System
+        of the same components that has been set up. Returns the
+        solver_state it was saved with.
+        """
+        layout, arrays = checkpoint.read(path)
+
+        names = set(component.name for component in self._components)
+
+        if(set(layout["components"]) != names):
+            Log.error("Checkpoint \"" + path + "\" does not match the system. Checkpoint components: " + ", ".join(sorted(layout["components"])) + ". System components: " + ", ".join(sorted(names)) + ".")
+
+        # Aliased variables go last. Their value is usually that of their
+        # source already, otherwise setting it ends the alias.
+        variables = [(component, name, variable) for component in self._components for name, variable in component.variables.items()]
+        variables.sort(key=lambda item: item[2].alias_of is not None)
+
+        variable: Variable
+        for component, name, variable in variables:
+            saved = layout["components"][component.name]["variables"].get(name)
+
+            if(saved is None):
+                Log.error("Checkpoint \"" + path + "\" has no variable " + component.name + " :: " + name + ".")
+
+            variable.initial = checkpoint.decode(saved["initial"], arrays)
+            variable.value = checkpoint.decode(saved["value"], arrays)
+
+            if(variable.alias_of is None):
+                variable.prev_value = checkpoint.decode(saved["prev_value"], arrays)
+
+        for component in self._components:
+            component.set_checkpoint_state(checkpoint.decode(layout["components"][component.name]["state"], arrays))
+
+        self.convergence_history = checkpoint.decode(layout["convergence_history"], arrays)
+
+        return checkpoint.decode(layout["solver_state"], arrays)
+
+    def group_residual(self, group: list) -> float:
+        if(self._state is None):
+            return sum(component.residual() for component in group)
+
+        residuals = self.component_residuals()
+
+        return float(np.sum(residuals[[self._component_numbers[component.name] for component in group]]))
+
     def march(self):
         for component in self._components:
             component.march()
 
+    def advance(self):
+        """ Makes the current values the initial values of the next time
+        step.
+        """
+        for component in self._components:
+            component.advance()
+
+    def set_time(self, time: float):
+        """ Sets the time at the end of the step being solved on every
+        component.
+        """
+        for component in self._components:
+            component.time = time
+
     def setup(self):
         for component in self._components:
             component.check_initials()
@@ -109,20 +843,50 @@ class System:
 
             component.log_message("Setup complete.")
 
-    def residual(self) -> float:
-        res = 0
+        self.build_update_plan()
+        self.build_schedule()
+        self.allocate_state()
 
-        for component in self._components:
-            res += component.residual()
+        for group, is_cycle in self._schedule:
+            if(is_cycle):
+                Log.message("Coupled components: " + ", ".join(component.name for component in group))
+
+        Log.message("Solve order: " + ", ".join(component.name for group, _ in self._schedule for component in group))
 
-        return res
+        if(self.execution == "jacobi"):
+            Log.message("Jacobi execution of " + str(len(self._levels)) + " levels on " + str(self.workers) + " " + self.pool + " workers.")
 
-    def connect(self, source: Variable, target: Variable):
+    def residual(self) -> float:
+        return float(np.sum(self.component_residuals()))
+
+    def connect(self, source: Variable, target: Variable, transfer: str = None):
+        """ Connects source to target, so that target takes the value of
+        source before its component is solved.
+
+        Mesh1DVars on different meshes are connected with a transfer, one of
+        "interpolate", "conservative" or "conservative_total" (see
+        aardvark.mesh.transfer.Transfer). The transfer is built as a sparse
+        matrix at setup and applied as one product on every update.
+        """
         if(type(source) is not type(target)):
             Log.error("Tried to connect " + source.component_name + " :: " + source.name + " to " + target.component_name + " :: " + target.name + " but they are not the same type.")
         
-        for _source, _target in self._connections:
-            if(_target is target):
-                Log.error(target.component_name + " :: " + target.name + " is already connected to a source.")
+        if(id(target) in self._connections_by_target):
+            Log.error(target.component_name + " :: " + target.name + " is already connected to a source.")
+
+        if(transfer is not None):
+            if(not isinstance(target, Mesh1DVar)):
+                Log.error("Tried to connect " + source.component_name + " :: " + source.name + " to " + target.component_name + " :: " + target.name + " with a transfer but transfers are only between Mesh1DVars.")
+
+            if(transfer not in transfer_kinds):
+                Log.error("Unknown transfer \"" + str(transfer) + "\". Options are " + ", ".join("\"" + kind + "\"" for kind in transfer_kinds) + ".")
+
+            self._transfers[id(target)] = transfer
 
         self._connections.append((source, target))
+        self._connections_by_target[id(target)] = (source, target)
+
+        # The update plan, solve order and aliases depend on the connections.
+        self._update_plan = None
+        self._schedule = None
+        self._state = None
@@ -5,7 +5,6 @@ from aardvark.mesh.mesh_1d import Mesh1D
 
 from abc import ABC, abstractmethod
 import numpy as np
-import matplotlib.pyplot as plt
 
 class Variable(ABC):
     @property
@@ -14,14 +13,48 @@ class Variable(ABC):
     
     @value.setter
     def value(self, value: np.ndarray):
-        self.prev_value = self._value
-
         if(value is None):
+            self.prev_value = self._value
             self._value = None
 
             return
 
-        self._value = np.array(value)
+        if(self._alias_of is not None):
+            # Components write some of their inputs back, e.g. FlowChannel1D
+            # writes Q_dot in "use_Q_dot" mode. Writing back the same value
+            # must not touch the source, anything else ends the alias.
+            if(np.array_equal(value, self._value)):
+                return
+
+            self.unalias()
+
+        if(self._buffer is None):
+            self.prev_value = self._value
+            self._value = self.check_value(np.array(value))
+
+            return
+
+        value = self.check_value(np.asarray(value))
+
+        self._prev_value[...] = self._value
+
+        try:
+            self._value[...] = value
+
+        except ValueError:
+            self.log_error("Tried to assign value of shape " + str(value.shape) + " to a variable of shape " + str(self._value.shape) + ".")
+
+    @property
+    def prev_value(self) -> np.ndarray:
+        return self._prev_value
+
+    @prev_value.setter
+    def prev_value(self, prev_value: np.ndarray):
+        if(self._buffer is None or prev_value is None):
+            self._prev_value = prev_value
+
+        else:
+            self._prev_value[...] = prev_value
 
     @property
     def initial(self) -> np.ndarray:
@@ -35,18 +68,94 @@ class Variable(ABC):
         else:
             self._initial = np.array(initial)
 
-    def __init__(self, component_name: str, name: str, units: str = None):
+    @property
+    def alias_of(self) -> Variable:
+        return self._alias_of
+
+    @property
+    def offset(self) -> int:
+        """ Start of the slice of the state buffer value is stored in. """
+        if(self._alias_of is not None):
+            return self._alias_of.offset
+
+        return self._offset
+
+    def __init__(self, component_name: str, name: str, units: str = None, n_channels: int = None):
         self.name = name
         self.units = units
 
         self.component_name = component_name
+        self.n_channels = n_channels
+
+        # Set by bind when the variable is stored in a System state buffer.
+        self._buffer = None
+        self._offset: int = None
+        self._alias_of: Variable = None
 
         self.initial: np.ndarray = None
         self._value: np.ndarray = None
+        self._prev_value: np.ndarray = None
         self.value: np.ndarray = None
+        self._clean_value: np.ndarray = None
 
         self.mesh = None
 
+        # Transfer from the mesh of the source of a connection. Set by the
+        # System for connections made with a transfer.
+        self.transfer = None
+
+    def __getstate__(self):
+        # Views pickle as copies of their own elements. The buffer is left
+        # behind, e.g. when a component is sent to a worker process.
+        state = self.__dict__.copy()
+        state["_buffer"] = None
+
+        return state
+
+    def check_value(self, value: np.ndarray) -> np.ndarray:
+        """ Checks the shape of a value before it is assigned. """
+        return value
+
+    def bind(self, buffer, offset: int):
+        """ Moves value and prev_value into views of buffer starting at
+        offset. The shape is the shape of initial.
+        """
+        value = self._value if self._value is not None else self.initial
+        prev_value = self._prev_value if self._prev_value is not None else value
+
+        self._buffer = buffer
+        self._offset = offset
+        self._alias_of = None
+
+        self._value, self._prev_value = buffer.view(offset, np.shape(self.initial))
+
+        self._value[...] = value
+        self._prev_value[...] = prev_value
+
+    def alias(self, source: Variable):
+        """ Makes value and prev_value the views of source, so that the
+        connection from source needs no copy.
+        """
+        self._alias_of = source
+
+        self._value = source._value
+        self._prev_value = source._prev_value
+
+    def unalias(self):
+        """ Moves back to the views of this variable, starting from the
+        current values of the source.
+        """
+        value = np.copy(self._value)
+        prev_value = np.copy(self._prev_value)
+
+        self._alias_of = None
+        self._value, self._prev_value = self._buffer.view(self._offset, value.shape)
+
+        self._value[...] = value
+        self._prev_value[...] = prev_value
+
+        self._buffer.version += 1
+
     def log_message(self, message: str):
         Log.error(self.component_name + " :: " + self.name + " :: " + message)
 
@@ -57,6 +166,28 @@ class Variable(ABC):
         if(self.initial is None):
             self.log_error("Initial is None.")
 
+    def is_dirty(self, rtol: float) -> bool:
+        """ Returns True if value changed by more than rtol relative to the
+        value saved by mark_clean, or if there is no saved value.
+        """
+        clean_value = self._clean_value
+
+        if(clean_value is None or np.shape(clean_value) != np.shape(self.value)):
+            return True
+
+        return bool(np.any(np.abs(self.value - clean_value) > rtol*np.abs(clean_value)))
+
+    def mark_clean(self):
+        self._clean_value = None if self.value is None else np.copy(self.value)
+
+    def relax(self, value: np.ndarray):
+        """ Sets value without moving it into prev_value, so the residual of
+        the next solve is measured from the relaxed value.
+        """
+        prev_value = np.copy(self.prev_value)
+        self.value = value
+        self.prev_value = prev_value
+
     @abstractmethod
     def r2(self) -> float:
         pass
@@ -66,68 +197,60 @@ class Variable(ABC):
         pass
 
 class FloatVar(Variable):
+    def check_value(self, value: np.ndarray) -> np.ndarray:
+        if(self.n_channels is not None and value.shape != (self.n_channels,)):
+            self.log_error("Tried to assign value to an improper size. value.shape = " + str(value.shape) + " and required shape is " + str((self.n_channels,)) + ".")
+
+        return value
+
+    def check_initial(self):
+        if(self.initial is None):
+            self.log_error("Initial is None.")
+
+        if(self.n_channels is None):
+            return
+
+        if(self.initial.size == 1):
+            self.initial = np.full(self.n_channels, self.initial.item())
+
+        elif(self.initial.shape != (self.n_channels,)):
+            self.log_error("Initial is an invalid size. initial.shape is \"" + str(self.initial.shape) + "\" and required shape is \"" + str((self.n_channels,)) + "\".")
+
     def r2(self) -> float:
-        return (self.value - self.prev_value)**2
+        return np.sum((self.value - self.prev_value)**2)
     
     def update_from(self, source: FloatVar):
         if(type(source) is not FloatVar):
             self.log_error("Source is not a FloatVar.")
 
-        self.value = np.copy(source.value)
-        self.initial = np.copy(source.initial)
+        self.value = source.value
+        self.initial = source.initial
 
 class Mesh1DVar(Variable):
+    def __init__(self, component_name: str, name: str, units: str, var_type: str = "node", n_channels: int = None):
+        self.var_type = var_type
 
-    @property
-    def value(self) -> np.ndarray:
-        return self._value
-    
-    @value.setter
-    def value(self, value: np.ndarray):
-        self.prev_value = self._value
-
-        if(value is None):
-            self._value = None
-
-            return
+        super().__init__(component_name, name, units, n_channels)
 
-        value = np.array(value)
+        self.mesh: Mesh1D = None
 
+    def check_value(self, value: np.ndarray) -> np.ndarray:
         if(self.var_type == "node"):
-            if(value.size != self.mesh.nodes.size):
-                self.log_error("Tried to assign value to an improper size. value.size = " + str(value.size) + " and nodes.size = " + str(self.mesh.nodes.size) + ".")
-        
-        elif(self.var_type == "cell"):
-            if(value.size != self.mesh.cells.size):
-                self.log_error("Tried to assign value to an improper size. value.size = " + str(value.size) + " and cells.size = " + str(self.mesh.cells.size) + ".")
-        
-        self._value = value
-
-    @property
-    def initial(self) -> np.ndarray:
-        return self._initial
-    
-    @initial.setter
-    def initial(self, initial):
-        if(initial is None):
-            self._initial = None
+            N = self.mesh.nodes.size
 
         else:
-            self._initial = np.array(initial)
+            N = self.mesh.cells.size
 
-    def __init__(self, component_name: str, name: str, units: str, var_type: str = "node"):
-        self.name = name
-        self.units = units
+        if(value.shape[-1:] != (N,)):
+            self.log_error("Tried to assign value to an improper size. value.shape = " + str(value.shape) + " and " + self.var_type + "s.size = " + str(N) + ".")
 
-        self.component_name = component_name
+        if(self.n_channels is None and value.ndim != 1):
+            self.log_error("Tried to assign value of shape " + str(value.shape) + " to a variable without channels.")
 
-        self.initial: np.ndarray = None
-        self._value: np.ndarray = None
-        self.value: np.ndarray = None
-        
-        self.var_type = var_type
+        if(self.n_channels is not None and value.shape != (self.n_channels, N)):
+            self.log_error("Tried to assign value with " + str(value.shape[0] if value.ndim > 1 else 1) + " channels but variable has " + str(self.n_channels) + " channels.")
 
-        self.mesh: Mesh1D = None
+        return value
 
     def check_initial(self):
         if(self.var_type == "node"):
@@ -139,11 +262,34 @@ class Mesh1DVar(Variable):
         if(self.initial is None):
             self.log_error("Initial is None.")
 
-        if(self.initial.size == 1):
+        if(self.n_channels is not None):
+            self.check_initial_channels(N)
+
+        elif(self.initial.size == 1):
             self.initial = np.array(N*[self.initial])
 
         elif(self.initial.size != N):
                 self.log_error("Initial is an invalid size. initial.size is \"" + str(self.initial.size) + "\" and required size is \"" + str(self.mesh.nodes.size) + "\".")
+
+    def check_initial_channels(self, N: int):
+        n = self.n_channels
+
+        # A single value, a single profile or one value per channel is
+        # broadcast to every channel.
+        if(self.initial.size == 1):
+            self.initial = np.full((n, N), self.initial.item())
+
+        elif(self.initial.shape == (n, N)):
+            pass
+
+        elif(self.initial.shape == (N,)):
+            self.initial = np.tile(self.initial, (n, 1))
+
+        elif(self.initial.shape == (n,)):
+            self.initial = np.repeat(self.initial[:, None], N, axis=1)
+
+        else:
+            self.log_error("Initial is an invalid size. initial.shape is \"" + str(self.initial.shape) + "\" and required shape is \"" + str((n, N)) + "\".")
             
     def r2(self) -> float:
         return np.sum((self.value - self.prev_value)**2)
@@ -152,9 +298,16 @@ class Mesh1DVar(Variable):
         if(type(source) is not Mesh1DVar):
             self.log_error("Source is not a Mesh1DVar.")
 
-        self.value = np.copy(source.value)
+        if(self.transfer is not None):
+            self.value = self.transfer.apply(source.value)
+
+        else:
+            self.value = source.value
     
     def plot(self):
+        # matplotlib is only needed for plotting and is slow to import.
+        import matplotlib.pyplot as plt
+
         if(self.var_type == "node"):
             xlabel = "Node X [m]"
             x = self.mesh.nodes
@@ -177,29 +330,31 @@ class Mesh1DVar(Variable):
         plt.grid(True)
         plt.tight_layout()
 
-        plt.plot(x, self.value, 'o')
+        plt.plot(x, np.transpose(self.value), 'o')
         plt.show()
  
 class FlowStateVar(Variable):
-    @property
-    def value(self) -> np.ndarray:
-        return self._value
-    
-    @value.setter
-    def value(self, value: np.ndarray):
-        self.prev_value = self._value
+    def check_value(self, value: np.ndarray) -> np.ndarray:
+        if(self.n_channels is None and value.size != 3):
+            self.log_error("Tried to set value using incorrect size. FlowStateVar.value must be of size 3. (T0, P0, m_dot).")
 
-        if(value is None):
-            self._value = None
+        if(self.n_channels is not None and value.shape != (self.n_channels, 3)):
+            self.log_error("Tried to set value using incorrect size. FlowStateVar.value must be of shape (n_channels, 3). (T0, P0, m_dot).")
 
-            return
+        return value
 
-        value = np.array(value)
+    def check_initial(self):
+        if(self.initial is None):
+            self.log_error("Initial is None.")
 
-        if(value.size != 3):
-            self.log_error("Tried to set value using incorrect size. FlowStateVar.value must be of size 3. (T0, P0, m_dot).")
+        if(self.n_channels is None):
+            return
+
+        if(self.initial.size == 3):
+            self.initial = np.tile(np.ravel(self.initial), (self.n_channels, 1))
 
-        self._value = value
+        elif(self.initial.shape != (self.n_channels, 3)):
+            self.log_error("Initial is an invalid size. initial.shape is \"" + str(self.initial.shape) + "\" and required shape is \"" + str((self.n_channels, 3)) + "\".")
             
     def r2(self) -> float:
         return np.sum((self.value - self.prev_value)**2)
@@ -208,5 +363,5 @@ class FlowStateVar(Variable):
         if(type(source) is not FlowStateVar):
             self.log_error("Target is not a FlowStateVar.")
 
-        self.value = np.copy(source.value)
-        self.initial = np.copy(source.initial)
\ No newline at end of file
+        self.value = source.value
+        self.initial = source.initial
\ No newline at end of file
@@ -3,6 +3,7 @@ import aardvark.component_api as adv
 
 class FlowChannel1D(adv.Component):
     component_type = "FlowChannel1D"
+    worker_state = ("warm_state", "node_iterations", "node_fallbacks", "channel_iterations")
 
     """ Solves the 1D area averaged Navier-Stokes equations for internal flow.
 
@@ -35,6 +36,43 @@ class FlowChannel1D(adv.Component):
 
     max_iter_per_node : int
         Maximum number of non-linear iterations per node.
+
+    node_solver : str
+        Method used for the non-linear conservation equations at each node.
+        "picard" updates energy, density, mass and momentum by successive
+        substitution. "newton" solves the energy, mass flux (rho*u) and
+        momentum residuals together with a Newton step on (T, u, P) using a
+        finite-difference Jacobian, and falls back to "picard" for any node
+        where Newton diverges. The Newton step is converged when the change
+        in (T, u, P) relative to the upstream node is below tol.
+
+    channel_solver : str
+        Solution engine for the channel. "march" solves one node at a time
+        from the inlet using node_solver. "implicit" solves all nodes at once
+        as a single non-linear system with Newton-Krylov iterations on a
+        sparse, block bidiagonal finite-difference Jacobian. The implicit
+        engine warm-starts from the last converged solution (or the current
+        T and P values before the first solve), is limited to
+        max_iter_per_node Newton iterations, and falls back to marching if it
+        does not converge.
+
+    warm_start : bool
+        If True, the last converged solution of the component is kept in
+        warm_state and used as the initial guess at every node of the next
+        solve instead of the upstream node's value. Later coupling
+        iterations then only pay for how much the inputs changed.
+
+    node_iterations : np.ndarray
+        Number of non-linear iterations taken at each node during the last
+        solve, None if it was not marched. Iterations from a Picard fallback
+        are added to the Newton iterations spent before it.
+
+    node_fallbacks : int
+        Number of nodes in the last solve where Newton diverged and the
+        Picard update was used instead.
+
+    channel_iterations : int
+        Number of Newton iterations taken by the last implicit solve.
     
 
     Variables
@@ -67,7 +105,8 @@ class FlowChannel1D(adv.Component):
 
     def __init__(self, name: str, mesh: adv.Mesh1D, A: float, P_wall: float,  
                  eps: float, fluid: adv.Fluid, hx_type: str = "adiabatic", tol: float = 1e-6, 
-                 max_iter_per_node: float = 1000):
+                 max_iter_per_node: float = 1000, node_solver: str = "picard",
+                 channel_solver: str = "march", warm_start: bool = True):
         self.initialize(name)
 
         self.mesh: adv.Mesh1D = mesh
@@ -82,6 +121,22 @@ class FlowChannel1D(adv.Component):
         self.tol = adv.np.array(tol)
         self.max_iter_per_node = adv.np.array(max_iter_per_node)
 
+        if(node_solver not in ("picard", "newton")):
+            self.log_error("Unknown node_solver \"" + str(node_solver) + "\". Options are \"picard\" and \"newton\".")
+
+        self.node_solver = node_solver
+
+        if(channel_solver not in ("march", "implicit")):
+            self.log_error("Unknown channel_solver \"" + str(channel_solver) + "\". Options are \"march\" and \"implicit\".")
+
+        self.channel_solver = channel_solver
+        self.warm_start = warm_start
+        self.warm_state = None
+
+        self.node_iterations = None
+        self.node_fallbacks = 0
+        self.channel_iterations = 0
+
     def declare_variables(self):
         self.inlet = self.add_flow_state_var("inlet", "SI")                         # Inlet Flow State ([K], [Pa], [kg/s])
         self.outlet = self.add_flow_state_var("outlet", "SI")                       # Outlet Flow State ([K], [Pa], [kg/s])
@@ -146,6 +201,9 @@ class FlowChannel1D(adv.Component):
         Nu = adv.np.zeros(self.mesh.nodes.size)     # Nusselt Number                   [Non-dimensional]
         htc = adv.np.zeros(self.mesh.nodes.size)    # Heat Transfer Coefficient        [W/m^2-K]
 
+        nodes = {"T": T, "P": P, "u": u, "rho": rho, "mu": mu, "cp": cp, "k": k,
+                 "e": e, "E": E, "Re": Re, "Pr": Pr, "ff": ff, "Nu": Nu, "htc": htc}
+
         # Calculate geometry from inputs
         Dh = 4*A/P_wall             # Hydraulic Diameter            [m^2]
 
@@ -157,13 +215,15 @@ class FlowChannel1D(adv.Component):
         T[0] = T_in
         P[0] = P_in
 
-        rho[0] = fluid.rho_from_T_P(T[0], P[0])
-        mu[0] = fluid.mu_from_T_P(T[0], P[0])
-        cp[0] = fluid.cp_from_T_P(T[0], P[0])
-        k[0] = fluid.k_from_T_P(T[0], P[0])
+        state = fluid.state_from_T_P(T[0], P[0])
+
+        rho[0] = state["rho"]
+        mu[0] = state["mu"]
+        cp[0] = state["cp"]
+        k[0] = state["k"]
 
         u[0] = m_dot / (rho[0]*A)
-        e[0] = fluid.e_from_T_P(T[0], P[0])
+        e[0] = state["e"]
         E[0] = e[0] + 0.5*u[0]**2
 
         Re[0] = adv.functions.reynolds(rho[0], u[0], Dh, mu[0])
@@ -175,31 +235,120 @@ class FlowChannel1D(adv.Component):
         htc[0] = Nu[0] * k[0] / Dh
 
         # MAIN SOLUTION LOOP
+        converged = False
+
+        self.node_iterations = None
+        self.node_fallbacks = 0
+        self.channel_iterations = 0
+
+        if(self.channel_solver == "implicit"):
+            converged = self.implicit_solve(nodes, T_wall, Q_dot, Q_dot_shape, Dh)
+
+            if(not converged):
+                self.log_warning("Implicit channel solve did not converge. Falling back to marching.")
+
+        if(not converged):
+            self.march_nodes(nodes, T_wall, Q_dot, Q_dot_shape, Dh)
+
+        if(self.hx_type == "use_T_wall"):
+            Q_dot = adv.np.sum(Q_dot_shape)
+
+        if(self.warm_start):
+            self.warm_state = {name: array.copy() for name, array in nodes.items()}
+        
+        T0_out, P0_out = adv.functions.static_to_stagnation_flow(T[-1], P[-1], m_dot, A, fluid)
+
+        # Update outputs
+        self.outlet.value = (T0_out, P0_out, m_dot)
+
+        self.T.value = T
+        self.P.value = P
+
+        self.Q_dot.value = Q_dot
+        self.Q_dot_shape.value = Q_dot_shape
+        self.T_wall.value = T_wall
+        
+        
+
+        # TODO Post values as well.
+
+    def march_nodes(self, nodes: dict, T_wall: adv.np.ndarray, Q_dot: float,
+                    Q_dot_shape: adv.np.ndarray, Dh: float):
+        """ Marches from the inlet node to the outlet, solving the
+        conservation equations one node at a time with node_solver.
+        """
+        # Attributes
+        A = self.A
+        P_wall = self.P_wall
+        eps = self.eps
+
+        fluid = self.fluid
+        tol = self.tol
+        max_iter_per_node = self.max_iter_per_node
+
+        T = nodes["T"]
+        P = nodes["P"]
+        u = nodes["u"]
+
+        rho = nodes["rho"]
+        mu = nodes["mu"]
+        cp = nodes["cp"]
+        k = nodes["k"]
+
+        e = nodes["e"]
+        E = nodes["E"]
+
+        Re = nodes["Re"]
+        Pr = nodes["Pr"]
+
+        ff = nodes["ff"]
+        Nu = nodes["Nu"]
+        htc = nodes["htc"]
+
+        node_iterations = adv.np.zeros(self.mesh.cells.size, dtype=int)
+        node_fallbacks = 0
+
+        warm_state = self.get_warm_state()
+
         for i in range(self.mesh.cells.size):
 
-            # Set initial guess for next node
-            T[i+1] = T[i]
-            P[i+1] = P[i]
+            # Set initial guess for next node from the last converged
+            # solution if there is one, otherwise from the upstream node.
+            if(warm_state is not None):
+                for name, array in nodes.items():
+                    array[i+1] = warm_state[name][i+1]
+
+            else:
+                T[i+1] = T[i]
+                P[i+1] = P[i]
 
-            rho[i+1] = rho[i]
-            mu[i+1] = mu[i]
-            cp[i+1] = cp[i]
-            k[i+1] = k[i]
+                rho[i+1] = rho[i]
+                mu[i+1] = mu[i]
+                cp[i+1] = cp[i]
+                k[i+1] = k[i]
 
-            u[i+1] = u[i]
-            e[i+1] = e[i]
-            E[i+1] = E[i]
+                u[i+1] = u[i]
+                e[i+1] = e[i]
+                E[i+1] = E[i]
 
-            Re[i+1] = Re[i]
-            Pr[i+1] = Pr[i]
+                Re[i+1] = Re[i]
+                Pr[i+1] = Pr[i]
 
-            ff[i+1] = ff[i]
-            Nu[i+1] = Nu[i]
-            htc[i+1] = htc[i]
+                ff[i+1] = ff[i]
+                Nu[i+1] = Nu[i]
+                htc[i+1] = htc[i]
 
         # Non-linear loop for conservation equations
             iter_no = 0
-            while(True):
+            converged = False
+
+            if(self.node_solver == "newton"):
+                converged, iter_no = self.newton_node(i, nodes, T_wall, Q_dot, Q_dot_shape, Dh)
+
+                if(not converged):
+                    node_fallbacks += 1
+
+            while(not converged):
                 iter_no += 1
 
             # Energy Equation
@@ -211,11 +360,11 @@ class FlowChannel1D(adv.Component):
                 T_avg = (T[i] + T[i+1])/2
 
                 if(self.hx_type == "adiabatic"):
+                    local_Q_dot = 0
                     T_wall[i] = T_avg
 
                 elif(self.hx_type == "use_T_wall"):
                     local_Q_dot = htc_avg*self.mesh.dx[i]*self.P_wall*(T_wall[i] - T_avg)
-                    Q_dot += local_Q_dot
                     Q_dot_shape[i] = local_Q_dot
 
                 elif(self.hx_type == "use_Q_dot"):
@@ -237,10 +386,13 @@ class FlowChannel1D(adv.Component):
                 e[i+1] = E[i+1] - 0.5*u[i+1]**2
 
                 # Use equation of state to get temperature.
-                T[i+1] = fluid.T_from_e_P(e[i+1], P[i+1])
+                T[i+1] = fluid.T_from_e_P_guess(e[i+1], P[i+1], T[i+1])
+
+            # Mass density from fluid properties calculation. One equation of
+            # state evaluation gives every property at the new (T, P).
+                state = fluid.state_from_T_P(T[i+1], P[i+1])
 
-            # Mass density from fluid properties calculation.
-                rho_new = fluid.rho_from_T_P(T[i+1], P[i+1])
+                rho_new = state["rho"]
                 rho_res = (rho[i+1] - rho_new)**2
                 rho[i+1] = rho_new
 
@@ -251,9 +403,9 @@ class FlowChannel1D(adv.Component):
                 u[i+1] = u_new
 
             # Momentum Conservation
-                mu[i+1] = fluid.mu_from_T_P(T[i+1], P[i+1])
-                cp[i+1] = fluid.cp_from_T_P(T[i+1], P[i+1])
-                k[i+1] = fluid.k_from_T_P(T[i+1], P[i+1])
+                mu[i+1] = state["mu"]
+                cp[i+1] = state["cp"]
+                k[i+1] = state["k"]
 
                 Re[i+1] = adv.functions.reynolds(rho[i+1], u[i+1], Dh, mu[i+1])
                 Pr[i+1] = adv.functions.prandtl(cp[i+1], mu[i+1], k[i+1])
@@ -283,19 +435,450 @@ class FlowChannel1D(adv.Component):
 
                 if(iter_no > max_iter_per_node):
                     self.log_error("Node " + str(i) + " did not converge after " + str(max_iter_per_node) + " iterations.")
-        
-        T0_out, P0_out = adv.functions.static_to_stagnation_flow(T[-1], P[-1], m_dot, A, fluid)
 
-        # Update outputs
-        self.outlet.value = (T0_out, P0_out, m_dot)
+            node_iterations[i] = iter_no
 
-        self.T.value = T
-        self.P.value = P
+        self.node_iterations = node_iterations
+        self.node_fallbacks = node_fallbacks
 
-        self.Q_dot.value = Q_dot
-        self.Q_dot_shape.value = Q_dot_shape
-        self.T_wall.value = T_wall
-        
-        
+    def get_profile_counters(self) -> dict:
+        counters = {"channel_iterations": self.channel_iterations, "node_fallbacks": self.node_fallbacks}
+
+        if(self.node_iterations is not None):
+            counters["node_iterations"] = int(adv.np.sum(self.node_iterations))
+            counters["node_iterations_max"] = int(adv.np.max(self.node_iterations, initial=0))
+            counters["node_iterations_per_node"] = adv.np.copy(self.node_iterations)
+
+        return counters
+
+    def get_warm_state(self) -> dict:
+        """ Returns the last converged solution if warm starting is enabled
+        and it matches the current mesh, otherwise None.
+        """
+        if(not self.warm_start or self.warm_state is None):
+            return None
+
+        if(self.warm_state["T"].size != self.mesh.nodes.size):
+            return None
+
+        return self.warm_state
+
+    def evaluate_node(self, i: int, x: adv.np.ndarray, nodes: dict, T_wall: adv.np.ndarray,
+                      Q_dot: float, Q_dot_shape: adv.np.ndarray, Dh: float) -> tuple:
+        """ Evaluates the conservation equations between node i and node i+1
+        for a guess x = (T, u, P) at node i+1.
+
+        Returns the residuals of the energy, mass flux and momentum equations,
+        each scaled by the magnitude of its upstream flux, and a dictionary of
+        the node i+1 values (and wall heat terms) consistent with x.
+        """
+        fluid = self.fluid
+        A = self.A
+        dx = self.mesh.dx[i]
+
+        T1, u1, P1 = x
+
+        T0 = nodes["T"][i]
+        P0 = nodes["P"][i]
+        u0 = nodes["u"][i]
+        rho0 = nodes["rho"][i]
+        E0 = nodes["E"][i]
+
+        state = fluid.state_from_T_P(T1, P1)
+
+        rho1 = state["rho"]
+        mu1 = state["mu"]
+        cp1 = state["cp"]
+        k1 = state["k"]
+        e1 = state["e"]
+        E1 = e1 + 0.5*u1**2
+
+        Re1 = adv.functions.reynolds(rho1, u1, Dh, mu1)
+        Pr1 = adv.functions.prandtl(cp1, mu1, k1)
+        ff1 = adv.functions.churchill(self.eps, Dh, Re1)
+        Nu1 = adv.functions.dittus_boelter(Re1, Pr1)
+        htc1 = Nu1 * k1 / Dh
+
+        htc_avg = (nodes["htc"][i] + htc1)/2
+        T_avg = (T0 + T1)/2
+
+        T_wall_i = T_wall[i]
+        Q_dot_shape_i = Q_dot_shape[i]
+
+        if(self.hx_type == "adiabatic"):
+            local_Q_dot = 0
+            T_wall_i = T_avg
+
+        elif(self.hx_type == "use_T_wall"):
+            local_Q_dot = htc_avg*dx*self.P_wall*(T_wall_i - T_avg)
+            Q_dot_shape_i = local_Q_dot
+
+        elif(self.hx_type == "use_Q_dot"):
+            local_Q_dot = Q_dot*Q_dot_shape_i
+            T_wall_i = local_Q_dot/(htc_avg*dx*self.P_wall) + T_avg
+
+        rho_avg = (rho0 + rho1)/2
+        u_avg = (u0 + u1)/2
+        ff_avg = (nodes["ff"][i] + ff1)/2
+
+        mass_flux = rho0*u0
+        energy_flux = mass_flux*E0 + u0*P0
+        momentum_flux = P0 + mass_flux*u0
+
+        energy_res = (rho1*u1*E1 + u1*P1 - local_Q_dot/A - energy_flux) / energy_flux
+        mass_res = (rho1*u1 - mass_flux) / mass_flux
+        momentum_res = (P1 + rho1*u1**2 + (ff_avg*dx*rho_avg*u_avg**2)/(2*Dh) - momentum_flux) / momentum_flux
+
+        values = {"T": T1, "P": P1, "u": u1, "rho": rho1, "mu": mu1, "cp": cp1, "k": k1,
+                  "e": e1, "E": E1, "Re": Re1, "Pr": Pr1, "ff": ff1, "Nu": Nu1, "htc": htc1,
+                  "T_wall": T_wall_i, "Q_dot_shape": Q_dot_shape_i}
+
+        return adv.np.array([energy_res, mass_res, momentum_res], dtype=float), values
+
+    def newton_node(self, i: int, nodes: dict, T_wall: adv.np.ndarray, Q_dot: float,
+                    Q_dot_shape: adv.np.ndarray, Dh: float) -> tuple:
+        """ Solves the conservation equations for node i+1 with Newton's
+        method, starting from the guess already stored in nodes.
+
+        The unknowns (T, u, P) are scaled by their upstream values and the
+        Jacobian is built from forward differences. Each step is backtracked
+        until the residual decreases. On success the node i+1 values are
+        written to nodes and (True, iterations) is returned. If Newton
+        diverges nothing is written and (False, iterations) is returned so
+        the caller can fall back to the Picard update.
+        """
+        scale = adv.np.array([nodes["T"][i], nodes["u"][i], nodes["P"][i]], dtype=float)
+        y = adv.np.array([nodes["T"][i+1], nodes["u"][i+1], nodes["P"][i+1]], dtype=float) / scale
+
+        def evaluate(y):
+            try:
+                res, values = self.evaluate_node(i, y*scale, nodes, T_wall, Q_dot, Q_dot_shape, Dh)
+
+            except ValueError:
+                return None, None
+
+            if(not adv.np.all(adv.np.isfinite(res))):
+                return None, None
+
+            return res, values
+
+        res, values = evaluate(y)
+
+        if(res is None):
+            return False, 0
+
+        h = 1e-7
+        J = adv.np.zeros((3, 3))
+
+        iter_no = 0
+        while(iter_no < self.max_iter_per_node):
+            iter_no += 1
+
+            for j in range(3):
+                y_h = y.copy()
+                y_h[j] += h
+
+                res_h, _ = evaluate(y_h)
+
+                if(res_h is None):
+                    return False, iter_no
+
+                J[:, j] = (res_h - res) / h
+
+            try:
+                dy = adv.np.linalg.solve(J, -res)
+
+            except adv.np.linalg.LinAlgError:
+                return False, iter_no
+
+            # Backtrack until the residual decreases. Once the step is below
+            # tolerance the residual is at round-off level and any step is
+            # accepted.
+            res_norm = adv.np.max(adv.np.abs(res))
+            step = 1.0
+            accepted = False
+
+            for _ in range(8):
+                y_new = y + step*dy
+
+                if(adv.np.all(y_new > 0)):
+                    res_new, values_new = evaluate(y_new)
+
+                    if(res_new is not None and (adv.np.max(adv.np.abs(res_new)) < res_norm
+                                                or adv.np.max(adv.np.abs(step*dy)) < self.tol)):
+                        accepted = True
+                        break
+
+                step = step/2
+
+            if(not accepted):
+                return False, iter_no
+
+            y = y_new
+            res = res_new
+            values = values_new
+
+            if(adv.np.max(adv.np.abs(step*dy)) < self.tol):
+                break
+
+        else:
+            return False, iter_no
+
+        for name, array in nodes.items():
+            array[i+1] = values[name]
+
+        T_wall[i] = values["T_wall"]
+        Q_dot_shape[i] = values["Q_dot_shape"]
+
+        return True, iter_no
+
+    def evaluate_channel(self, X: adv.np.ndarray, nodes: dict, T_wall: adv.np.ndarray,
+                         Q_dot: float, Q_dot_shape: adv.np.ndarray, Dh: float) -> tuple:
+        """ Evaluates the conservation equations in every cell at once for a
+        guess X of shape (number of cells, 3) holding (T, u, P) at nodes 1
+        through N-1. Node 0 is taken from nodes.
+
+        Returns the residuals of the energy, mass flux and momentum equations
+        in each cell, scaled by the inlet fluxes, and a dictionary of node
+        and wall heat arrays consistent with X.
+        """
+        fluid = self.fluid
+        A = self.A
+        dx = self.mesh.dx
+
+        T = adv.np.concatenate(([nodes["T"][0]], X[:, 0]))
+        u = adv.np.concatenate(([nodes["u"][0]], X[:, 1]))
+        P = adv.np.concatenate(([nodes["P"][0]], X[:, 2]))
+
+        state = fluid.state_from_T_P(T[1:], P[1:])
+
+        rho = adv.np.concatenate(([nodes["rho"][0]], state["rho"]))
+        mu = adv.np.concatenate(([nodes["mu"][0]], state["mu"]))
+        cp = adv.np.concatenate(([nodes["cp"][0]], state["cp"]))
+        k = adv.np.concatenate(([nodes["k"][0]], state["k"]))
+        e = adv.np.concatenate(([nodes["e"][0]], state["e"]))
+        E = e + 0.5*u**2
+
+        Re = adv.functions.reynolds(rho, u, Dh, mu)
+        Pr = adv.functions.prandtl(cp, mu, k)
+        ff = adv.functions.churchill(self.eps, Dh, Re)
+        Nu = adv.functions.dittus_boelter(Re, Pr)
+        htc = Nu * k / Dh
+
+        htc_avg = (htc[:-1] + htc[1:])/2
+        T_avg = (T[:-1] + T[1:])/2
+
+        T_wall = adv.np.array(T_wall, dtype=float)
+        Q_dot_shape = adv.np.array(Q_dot_shape, dtype=float)
+
+        if(self.hx_type == "adiabatic"):
+            local_Q_dot = adv.np.zeros(T_avg.size)
+            T_wall = T_avg
+
+        elif(self.hx_type == "use_T_wall"):
+            local_Q_dot = htc_avg*dx*self.P_wall*(T_wall - T_avg)
+            Q_dot_shape = local_Q_dot
+
+        elif(self.hx_type == "use_Q_dot"):
+            local_Q_dot = Q_dot*Q_dot_shape
+            T_wall = local_Q_dot/(htc_avg*dx*self.P_wall) + T_avg
+
+        rho_avg = (rho[:-1] + rho[1:])/2
+        u_avg = (u[:-1] + u[1:])/2
+        ff_avg = (ff[:-1] + ff[1:])/2
+
+        mass_flux = rho*u
+        energy_flux = mass_flux*E + u*P
+        momentum_flux = P + mass_flux*u
+
+        energy_res = (energy_flux[1:] - energy_flux[:-1] - local_Q_dot/A) / energy_flux[0]
+        mass_res = (mass_flux[1:] - mass_flux[:-1]) / mass_flux[0]
+        momentum_res = (momentum_flux[1:] - momentum_flux[:-1] + (ff_avg*dx*rho_avg*u_avg**2)/(2*Dh)) / momentum_flux[0]
+
+        values = {"T": T, "P": P, "u": u, "rho": rho, "mu": mu, "cp": cp, "k": k,
+                  "e": e, "E": E, "Re": Re, "Pr": Pr, "ff": ff, "Nu": Nu, "htc": htc,
+                  "T_wall": T_wall, "Q_dot_shape": Q_dot_shape}
+
+        return adv.np.column_stack((energy_res, mass_res, momentum_res)), values
+
+    def implicit_solve(self, nodes: dict, T_wall: adv.np.ndarray, Q_dot: float,
+                       Q_dot_shape: adv.np.ndarray, Dh: float) -> bool:
+        """ Solves all nodes of the channel as one non-linear system.
+
+        The unknowns are (T, u, P) at nodes 1 through N-1, scaled by the
+        inlet values. The residual in cell i only depends on nodes i and i+1,
+        so the Jacobian is block bidiagonal and is built from six
+        forward-difference residual evaluations by perturbing every other
+        node at once. Each Newton step is solved with GMRES preconditioned
+        by an incomplete LU factorization of the Jacobian and is backtracked
+        until the residual decreases.
+
+        The initial guess is the current T and P values of the component.
+        On success the node arrays and wall heat arrays are filled in and
+        True is returned. Otherwise nothing is written and False is returned.
+        """
+        import scipy.sparse
+        import scipy.sparse.linalg
+
+        n_cells = self.mesh.cells.size
+        n = 3*n_cells
+
+        self.channel_iterations = 0
+
+        # Initial guess from the last converged solution, or from the
+        # current values if there is none.
+        warm_state = self.get_warm_state()
+
+        if(warm_state is not None):
+            T_guess = warm_state["T"]
+            P_guess = warm_state["P"]
+
+        else:
+            T_guess = self.T.value
+            P_guess = self.P.value
+
+        if(T_guess is None or P_guess is None or adv.np.size(T_guess) != n_cells + 1 or adv.np.size(P_guess) != n_cells + 1):
+            return False
+
+        T_guess = adv.np.array(T_guess, dtype=float)[1:]
+        P_guess = adv.np.array(P_guess, dtype=float)[1:]
+
+        try:
+            rho_guess = self.fluid.state_from_T_P(T_guess, P_guess)["rho"]
+
+        except ValueError:
+            return False
+
+        u_guess = nodes["rho"][0]*nodes["u"][0]/rho_guess
+
+        scale = adv.np.array([nodes["T"][0], nodes["u"][0], nodes["P"][0]], dtype=float)
+        y = adv.np.column_stack((T_guess, u_guess, P_guess)).ravel() / adv.np.tile(scale, n_cells)
+
+        def evaluate(y):
+            X = y.reshape(n_cells, 3)*scale
+
+            try:
+                res, values = self.evaluate_channel(X, nodes, T_wall, Q_dot, Q_dot_shape, Dh)
+
+            except ValueError:
+                return None, None
+
+            res = res.ravel()
+
+            if(not adv.np.all(adv.np.isfinite(res))):
+                return None, None
+
+            return res, values
+
+        res, values = evaluate(y)
+
+        if(res is None):
+            return False
+
+        h = 1e-7
+
+        # Sparsity pattern of the block bidiagonal Jacobian. Unknown m is
+        # variable m % 3 at node m//3 + 1 and only touches the residuals of
+        # cells m//3 and m//3 + 1.
+        cols = adv.np.arange(n)
+        node = cols // 3
+
+        rows_diag = 3*node[:, None] + adv.np.arange(3)[None, :]
+        rows_sub = rows_diag + 3
+        has_sub = node < n_cells - 1
+
+        jac_rows = adv.np.concatenate((rows_diag.ravel(), rows_sub[has_sub].ravel()))
+        jac_cols = adv.np.concatenate((adv.np.repeat(cols, 3), adv.np.repeat(cols[has_sub], 3)))
+
+        iter_no = 0
+        while(iter_no < self.max_iter_per_node):
+            iter_no += 1
+
+            diag = adv.np.zeros((n, 3))
+            sub = adv.np.zeros((n, 3))
+
+            for color in range(2):
+                for var in range(3):
+                    perturbed = (node % 2 == color) & (cols % 3 == var)
+
+                    y_h = y.copy()
+                    y_h[perturbed] += h
+
+                    res_h, _ = evaluate(y_h)
+
+                    if(res_h is None):
+                        self.channel_iterations = iter_no
+                        return False
+
+                    dres = ((res_h - res) / h).reshape(n_cells, 3)
+
+                    m = cols[perturbed]
+                    diag[m] = dres[node[m]]
+
+                    m_sub = m[has_sub[m]]
+                    sub[m_sub] = dres[node[m_sub] + 1]
+
+            jac_data = adv.np.concatenate((diag.ravel(), sub[has_sub].ravel()))
+            J = scipy.sparse.csc_matrix((jac_data, (jac_rows, jac_cols)), shape=(n, n))
+
+            try:
+                ilu = scipy.sparse.linalg.spilu(J)
+                M = scipy.sparse.linalg.LinearOperator((n, n), ilu.solve)
+
+                dy, info = scipy.sparse.linalg.gmres(J, -res, M=M, rtol=1e-10, atol=0)
+
+                if(info != 0):
+                    dy = scipy.sparse.linalg.spsolve(J, -res)
+
+            except RuntimeError:
+                self.channel_iterations = iter_no
+                return False
+
+            if(not adv.np.all(adv.np.isfinite(dy))):
+                self.channel_iterations = iter_no
+                return False
+
+            # Backtrack until the residual decreases. Once the step is below
+            # tolerance the residual is at round-off level and any step is
+            # accepted.
+            res_norm = adv.np.max(adv.np.abs(res))
+            step = 1.0
+            accepted = False
+
+            for _ in range(8):
+                y_new = y + step*dy
+
+                if(adv.np.all(y_new > 0)):
+                    res_new, values_new = evaluate(y_new)
+
+                    if(res_new is not None and (adv.np.max(adv.np.abs(res_new)) < res_norm
+                                                or adv.np.max(adv.np.abs(step*dy)) < self.tol)):
+                        accepted = True
+                        break
+
+                step = step/2
+
+            if(not accepted):
+                self.channel_iterations = iter_no
+                return False
+
+            y = y_new
+            res = res_new
+            values = values_new
+
+            if(adv.np.max(adv.np.abs(step*dy)) < self.tol):
+                break
+
+        else:
+            self.channel_iterations = iter_no
+            return False
+
+        self.channel_iterations = iter_no
+
+        for name, array in nodes.items():
+            array[1:] = values[name][1:]
+
+        T_wall[:] = values["T_wall"]
+        Q_dot_shape[:] = values["Q_dot_shape"]
 
-        # TODO Post values as well.
\ No newline at end of file
+        return True
@@ -0,0 +1,327 @@
+import aardvark.component_api as adv
+
+
+class FlowChannelBank(adv.Component):
+    component_type = "FlowChannelBank"
+
+    """ Solves the 1D area averaged Navier-Stokes equations for a bank of
+    parallel internal flow channels that share an axial mesh.
+
+    Each channel is governed by the same equations as FlowChannel1D, but the
+    channels are marched axially together. At every node the non-linear
+    iteration is vectorized across channels and a channel drops out of the
+    iteration as soon as its own residual is below tolerance.
+
+    Friction factor is calculated using the Churchill friction factor
+    correlation. Nusselt number is calculated using the Dittus-Boelter Nusselt
+    number correlation.
+
+    Attributes
+    ----------
+    name : str
+        Unique name to identify the component.
+
+    mesh : Mesh1D
+        Mesh to define problem space. Shared by all channels.
+
+    n_channels : int
+        Number of channels in the bank.
+
+    A : float or np.ndarray
+        Cross sectional flow area of each channel in [m^2]. Scalar or one
+        value per channel.
+
+    P_wall : float or np.ndarray
+        Wetted perimeter of each channel in [m]. Scalar or one value per
+        channel.
+
+    eps : float or np.ndarray
+        Wall roughness of each channel [m]. Scalar or one value per channel.
+
+    fluid : adv.Fluid
+        Material object representing the fluid properties in the channels.
+
+    tol : float
+        Tolerance for residuals of Navier-Stokes equations at each node.
+
+    max_iter_per_node : int
+        Maximum number of non-linear iterations per node.
+
+
+    Variables
+    ----------
+    inlet : adv.FlowStateVar
+        Flow state at inlet of each channel, shape (n_channels, 3).
+        (T0 [K], P0 [Pa], m_dot [kg/s])
+
+    outlet : adv.FlowStateVar
+        Flow state at outlet of each channel, shape (n_channels, 3).
+        (T0 [K], P0 [Pa], m_dot [kg/s])
+
+    T : adv.Mesh1DVar
+        Static temperature at each node in [K]. Shape is
+        (n_channels, number of nodes).
+
+    P : adv.Mesh1DVar
+        Static pressure at each node in [Pa]. Shape is
+        (n_channels, number of nodes).
+
+    Q_dot : adv.FloatVar
+        Total heat added to each flow channel in [W]. Shape is (n_channels,).
+
+    Q_dot_shape : adv.Mesh1DVar
+        Relative fraction of Q_dot added to each cell. Each channel's row is
+        normalized internally so it sums to 1. Shape is
+        (n_channels, number of cells).
+
+    T_wall : adv.Mesh1DVar
+        Wall temperature in [K]. Shape is (n_channels, number of cells).
+
+    """
+
+    def __init__(self, name: str, mesh: adv.Mesh1D, n_channels: int, A, P_wall,
+                 eps, fluid: adv.Fluid, hx_type: str = "adiabatic", tol: float = 1e-6,
+                 max_iter_per_node: float = 1000):
+        self.n_channels = int(n_channels)
+
+        self.initialize(name)
+
+        self.mesh: adv.Mesh1D = mesh
+
+        self.A = self.per_channel(A)
+        self.P_wall = self.per_channel(P_wall)
+        self.eps = self.per_channel(eps)
+
+        self.fluid = fluid
+        self.hx_type = hx_type
+
+        self.tol = adv.np.array(tol)
+        self.max_iter_per_node = adv.np.array(max_iter_per_node)
+
+    def declare_variables(self):
+        n = self.n_channels
+
+        self.inlet = self.add_flow_state_var("inlet", "SI", n)                          # Inlet Flow State ([K], [Pa], [kg/s])
+        self.outlet = self.add_flow_state_var("outlet", "SI", n)                        # Outlet Flow State ([K], [Pa], [kg/s])
+
+        self.T = self.add_mesh1d_var("T", "K", "node", n)                               # Static Temperature [K]
+        self.P = self.add_mesh1d_var("P", "Pa", "node", n)                              # Static Pressure [Pa]
+
+        self.Q_dot = self.add_float_var("Q_dot", "W", n)                                # Total Heat [W]
+        self.Q_dot_shape = self.add_mesh1d_var("Q_dot_shape", "Unitless", "cell", n)    # Heat Shape [Unitless]
+        self.T_wall = self.add_mesh1d_var("T_wall", "K", "cell", n)                     # Wall Temperature [K]
+
+    def per_channel(self, value) -> adv.np.ndarray:
+        value = adv.np.array(value, dtype=float)
+
+        if(value.size == 1):
+            return adv.np.full(self.n_channels, value.item())
+
+        if(value.shape != (self.n_channels,)):
+            self.log_error("Expected a scalar or " + str(self.n_channels) + " values but got shape " + str(value.shape) + ".")
+
+        return value
+
+    def setup(self):
+        pass
+
+    def solve(self, dt: float):
+        n = self.n_channels
+        n_nodes = self.mesh.nodes.size
+        n_cells = self.mesh.cells.size
+
+        # Inputs
+        T0_in, P0_in, m_dot = adv.np.transpose(self.inlet.value)
+
+        if(self.hx_type == "adiabatic"):
+            T_wall = adv.np.zeros((n, n_cells))
+            Q_dot = adv.np.zeros(n)
+            Q_dot_shape = adv.np.ones((n, n_cells)) / n_cells
+
+        elif(self.hx_type == "use_Q_dot"):
+            T_wall = adv.np.zeros((n, n_cells))
+            Q_dot = adv.np.array(self.Q_dot.value, dtype=float)
+            Q_dot_shape = self.Q_dot_shape.value / adv.np.sum(self.Q_dot_shape.value, axis=1, keepdims=True)
+
+        elif(self.hx_type == "use_T_wall"):
+            T_wall = adv.np.array(self.T_wall.value, dtype=float)
+            Q_dot = adv.np.zeros(n)
+            Q_dot_shape = adv.np.zeros((n, n_cells))
+
+        # Attributes
+        A = self.A
+        P_wall = self.P_wall
+        eps = self.eps
+        dx = self.mesh.dx
+
+        fluid = self.fluid
+        tol = self.tol
+        max_iter_per_node = self.max_iter_per_node
+
+        # Initialize output arrays
+        T = adv.np.zeros((n, n_nodes))      # Temperature                      [K]
+        P = adv.np.zeros((n, n_nodes))      # Pressure                         [Pa]
+        u = adv.np.zeros((n, n_nodes))      # Velocity                         [m/s]
+
+        # Initialize post processing arrays
+        rho = adv.np.zeros((n, n_nodes))    # Mass Density                     [kg/m^3]
+        mu = adv.np.zeros((n, n_nodes))     # Dynamic Viscosity                [Pa-s]
+        cp = adv.np.zeros((n, n_nodes))     # Specific Heat (Const P)          [J/kg-K]
+        k = adv.np.zeros((n, n_nodes))      # Thermal Conductivity             [W/m-K]
+
+        e = adv.np.zeros((n, n_nodes))      # Specific internal energy         [J/kg]
+        E = adv.np.zeros((n, n_nodes))      # Total specific internal energy   [J/kg]
+
+        Re = adv.np.zeros((n, n_nodes))     # Reynolds Number                  [Non-dimensional]
+        Pr = adv.np.zeros((n, n_nodes))     # Prandtl Number                   [Non-dimensional]
+
+        ff = adv.np.zeros((n, n_nodes))     # Friction Factor                  [Non-dimensional]
+        Nu = adv.np.zeros((n, n_nodes))     # Nusselt Number                   [Non-dimensional]
+        htc = adv.np.zeros((n, n_nodes))    # Heat Transfer Coefficient        [W/m^2-K]
+
+        node_arrays = (T, P, u, rho, mu, cp, k, e, E, Re, Pr, ff, Nu, htc)
+
+        # Calculate geometry from inputs
+        Dh = 4*A/P_wall             # Hydraulic Diameter            [m^2]
+
+        # Get Static Conditions
+        T_in, P_in = adv.functions.stagnation_to_static_flow(T0_in, P0_in, m_dot, A, fluid,
+                                                             max_iter_per_node, tol)
+
+        # Add inlet values to variable arrays
+        T[:, 0] = T_in
+        P[:, 0] = P_in
+
+        state = fluid.state_from_T_P(T[:, 0], P[:, 0])
+
+        rho[:, 0] = state["rho"]
+        mu[:, 0] = state["mu"]
+        cp[:, 0] = state["cp"]
+        k[:, 0] = state["k"]
+
+        u[:, 0] = m_dot / (rho[:, 0]*A)
+        e[:, 0] = state["e"]
+        E[:, 0] = e[:, 0] + 0.5*u[:, 0]**2
+
+        Re[:, 0] = adv.functions.reynolds(rho[:, 0], u[:, 0], Dh, mu[:, 0])
+        Pr[:, 0] = adv.functions.prandtl(cp[:, 0], mu[:, 0], k[:, 0])
+
+        ff[:, 0] = adv.functions.churchill(eps, Dh, Re[:, 0])
+        Nu[:, 0] = adv.functions.dittus_boelter(Re[:, 0], Pr[:, 0])
+
+        htc[:, 0] = Nu[:, 0] * k[:, 0] / Dh
+
+        # MAIN SOLUTION LOOP
+        for i in range(n_cells):
+
+            # Set initial guess for next node
+            for array in node_arrays:
+                array[:, i+1] = array[:, i]
+
+        # Non-linear loop for conservation equations. Only the channels that
+        # have not converged yet (j) are updated on each pass.
+            j = adv.np.arange(n)
+            iter_no = 0
+            while(j.size > 0):
+                iter_no += 1
+
+            # Energy Equation
+                Nu[j, i+1] = adv.functions.dittus_boelter(Re[j, i+1], Pr[j, i+1])
+
+                htc[j, i+1] = Nu[j, i+1] * k[j, i+1] / Dh[j]
+
+                htc_avg = (htc[j, i] + htc[j, i+1])/2
+                T_avg = (T[j, i] + T[j, i+1])/2
+
+                if(self.hx_type == "adiabatic"):
+                    local_Q_dot = 0
+                    T_wall[j, i] = T_avg
+
+                elif(self.hx_type == "use_T_wall"):
+                    local_Q_dot = htc_avg*dx[i]*P_wall[j]*(T_wall[j, i] - T_avg)
+                    Q_dot_shape[j, i] = local_Q_dot
+
+                elif(self.hx_type == "use_Q_dot"):
+                    local_Q_dot = Q_dot[j]*Q_dot_shape[j, i]
+                    T_wall[j, i] = local_Q_dot/(htc_avg*dx[i]*P_wall[j]) + T_avg
+
+                # C1 through C5 are just intermediate values to calculate
+                # energy equation.
+                C1 = 1/(u[j, i+1]*rho[j, i+1])
+                C2 = local_Q_dot/A[j]
+                C3 = -u[j, i+1]*P[j, i+1]
+                C4 = u[j, i]*rho[j, i]*E[j, i]
+                C5 = u[j, i]*P[j, i]
+
+                E_new = C1*(C2+C3+C4+C5)
+                energy_res = (E[j, i+1] - E_new)**2
+
+                E[j, i+1] = E_new
+                e[j, i+1] = E[j, i+1] - 0.5*u[j, i+1]**2
+
+                # Use equation of state to get temperature.
+                T[j, i+1] = fluid.T_from_e_P_guess(e[j, i+1], P[j, i+1], T[j, i+1])
+
+            # Mass density from fluid properties calculation. One equation of
+            # state evaluation gives every property at the new (T, P).
+                state = fluid.state_from_T_P(T[j, i+1], P[j, i+1])
+
+                rho_new = state["rho"]
+                rho_res = (rho[j, i+1] - rho_new)**2
+                rho[j, i+1] = rho_new
+
+            # Mass Conservation
+                u_new = rho[j, i]*u[j, i]/rho[j, i+1]
+                mass_res = (u[j, i+1] - u_new)**2
+
+                u[j, i+1] = u_new
+
+            # Momentum Conservation
+                mu[j, i+1] = state["mu"]
+                cp[j, i+1] = state["cp"]
+                k[j, i+1] = state["k"]
+
+                Re[j, i+1] = adv.functions.reynolds(rho[j, i+1], u[j, i+1], Dh[j], mu[j, i+1])
+                Pr[j, i+1] = adv.functions.prandtl(cp[j, i+1], mu[j, i+1], k[j, i+1])
+
+                ff[j, i+1] = adv.functions.churchill(eps[j], Dh[j], Re[j, i+1])
+
+                rho_avg = (rho[j, i] + rho[j, i+1])/2
+                u_avg = (u[j, i] + u[j, i+1]) / 2
+                ff_avg = (ff[j, i] + ff[j, i+1]) / 2
+
+                # C1 through C4 are just intermediate values to calculate
+                # momentum equation.
+                C1 = P[j, i]
+                C2 = rho[j, i]*u[j, i]**2
+                C3 = -rho[j, i+1]*u[j, i+1]**2
+                C4 = -(ff_avg*dx[i]*rho_avg*u_avg**2)/(2*Dh[j])
+
+                P_new = C1 + C2 + C3 + C4
+
+                momentum_res = (P[j, i+1] - P_new)**2
+
+                P[j, i+1] = P_new
+
+                # Drop channels whose node has converged. A NaN residual is not
+                # converged, so the channel keeps iterating up to the error.
+                res = adv.np.sqrt(adv.np.maximum.reduce([mass_res, momentum_res, energy_res, rho_res]))
+                j = j[~(res < tol)]
+
+                if(j.size > 0 and iter_no > max_iter_per_node):
+                    self.log_error("Node " + str(i) + " did not converge after " + str(max_iter_per_node) + " iterations in channels " + str(j.tolist()) + ".")
+
+        if(self.hx_type == "use_T_wall"):
+            Q_dot = adv.np.sum(Q_dot_shape, axis=1)
+
+        T0_out, P0_out = adv.functions.static_to_stagnation_flow(T[:, -1], P[:, -1], m_dot, A, fluid)
+
+        # Update outputs
+        self.outlet.value = adv.np.column_stack((T0_out, P0_out, m_dot))
+
+        self.T.value = T
+        self.P.value = P
+
+        self.Q_dot.value = Q_dot
+        self.Q_dot_shape.value = Q_dot_shape
+        self.T_wall.value = T_wall
@@ -1,5 +1,4 @@
 import numpy as np
-import scipy.optimize
 
 
 def laminar_friction_factor(Re: float) -> float:
@@ -10,8 +10,10 @@ def stagnation_to_static_flow(T0: float, P0: float, m_dot: float, A: float,
     P = P0
 
     for _ in range(max_iter):
-        rho = fluid.rho_from_T_P(T, P)
-        cp = fluid.cp_from_T_P(T, P)
+        state = fluid.state_from_T_P(T, P)
+
+        rho = state["rho"]
+        cp = state["cp"]
 
         u = m_dot / (rho*A)
 
@@ -23,15 +25,17 @@ def stagnation_to_static_flow(T0: float, P0: float, m_dot: float, A: float,
 
         res = np.sqrt((T-T_prev)**2 + (P-P_prev)**2)
 
-        if(res < tol):
+        if(np.all(res < tol)):
             return np.array(T), np.array(P)
 
     # TODO replace with logging system
     raise Exception("StagnationToStaticFlow not converged")
     
 def static_to_stagnation_flow(T: float, P: float, m_dot: float, A: float, fluid: Fluid) -> tuple:
-    rho = fluid.rho_from_T_P(T, P)
-    cp = fluid.cp_from_T_P(T, P)
+    state = fluid.state_from_T_P(T, P)
+
+    rho = state["rho"]
+    cp = state["cp"]
 
     u = m_dot / rho*A
 
@@ -1,3 +1,16 @@
 from aardvark.materials.fluids.ideal_gas import IdealGas
 
-from aardvark.materials.fluids.hydrogen import Hydrogen
\ No newline at end of file
+from aardvark.materials.fluids.tabulated_fluid import TabulatedFluid
+from aardvark.materials.fluids.cached_fluid import CachedFluid
+from aardvark.materials.fluids.inverse_eos import InverseEOS
+
+
+def __getattr__(name):
+    # Hydrogen imports CoolProp, which dominates the import time of the
+    # package, so it is only imported on first access.
+    if(name == "Hydrogen"):
+        from aardvark.materials.fluids.hydrogen import Hydrogen
+
+        return Hydrogen
+
+    raise AttributeError("module " + repr(__name__) + " has no attribute " + repr(name))
@@ -0,0 +1,201 @@
+from aardvark.base.fluid import Fluid, state_dtype
+
+from collections import OrderedDict
+import math
+import threading
+
+import numpy as np
+
+
+class CachedFluid(Fluid):
+    """ Wraps another fluid with a bounded least recently used cache of its
+    property calls.
+
+    Each call is keyed on the method name and on both arguments quantized to
+    a relative tolerance, so states that differ by less than rtol share a
+    cache entry. The value stored for an entry is the one computed for the
+    first state that landed in it. Misses in an array call are evaluated by
+    the wrapped fluid in a single array call. Once the cache holds
+    max_entries the least recently used entries are evicted.
+
+    One instance can be passed to every channel of a System so they share
+    the cache, also when the System solves components on several threads.
+    rtol should stay well below the relative finite-difference step of the
+    Newton solvers (1e-7) or their Jacobians will see a flat property
+    surface.
+
+    With rtol > 0 the value of an entry depends on which state reached it
+    first. When components sharing the cache are solved on several threads
+    or processes that is up to the order the workers run in, so results only
+    agree to about rtol from run to run and the counters vary. rtol = 0
+    only shares exact states and keeps results bit-identical for any number
+    of workers. benchmarks/jacobi_workers.py checks both. The Picard march
+    of FlowChannel1D compares absolute changes with its tol and can cycle
+    between neighbouring entries when rtol times the pressure or energy is
+    above tol, so use node_solver="newton" with rtol > 0.
+
+    Attributes
+    ----------
+    fluid : Fluid
+        Wrapped fluid the properties are computed with.
+
+    rtol : float
+        Relative tolerance the arguments are quantized to. 0 caches exact
+        states only.
+
+    max_entries : int
+        Maximum number of cached entries.
+
+    hits, misses, evictions : int
+        Counters of cache hits, misses and evicted entries.
+
+    """
+
+    def __init__(self, fluid: Fluid, rtol: float = 1e-10, max_entries: int = 100000):
+        self.fluid = fluid
+        self.fluid_name = getattr(fluid, "fluid_name", "")
+
+        self.rtol = rtol
+        self.max_entries = max_entries
+
+        self._step = math.log1p(rtol) if rtol > 0 else 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getstate__(self):
+        # Locks can not be pickled, e.g. to send a component to a worker
+        # process. Each process gets its own lock.
+        state = self.__dict__.copy()
+        del state["_lock"]
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def _quantize(self, x: float):
+        # Bins are uniform in log(|x|) so the tolerance is relative. The
+        # sign is kept so that energies below the reference state work too.
+        # NaN and inf from a diverging iterate are keyed as they are, so the
+        # wrapped fluid and the caller get to handle them.
+        if(self._step == 0 or x == 0 or not math.isfinite(x)):
+            return x
+
+        return (x > 0, round(math.log(abs(x)) / self._step))
+
+    def _store(self, key, value):
+        self._cache[key] = value
+
+        while(len(self._cache) > self.max_entries):
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    def _cached(self, method: str, x1, x2, dtype=float):
+        cache = self._cache
+
+        # The wrapped fluid is called outside of the lock so that threads
+        # only wait on each other for the dictionary operations.
+        if(np.ndim(x1) == 0 and np.ndim(x2) == 0):
+            key = (method, self._quantize(float(x1)), self._quantize(float(x2)))
+
+            with self._lock:
+                value = cache.get(key)
+
+                if(value is not None):
+                    cache.move_to_end(key)
+                    self.hits += 1
+
+                else:
+                    self.misses += 1
+
+            if(value is not None):
+                return np.array(value, dtype=dtype) if dtype is state_dtype else value
+
+            value = getattr(self.fluid, method)(x1, x2)
+
+            with self._lock:
+                self._store(key, value.item() if dtype is state_dtype else float(value))
+
+            return value
+
+        x1, x2 = np.broadcast_arrays(np.asarray(x1, dtype=float), np.asarray(x2, dtype=float))
+
+        value = np.empty(x1.shape, dtype=dtype)
+        flat_value = value.reshape(-1)
+
+        keys = [(method, self._quantize(x1_n), self._quantize(x2_n))
+                for x1_n, x2_n in zip(x1.ravel().tolist(), x2.ravel().tolist())]
+
+        missed = []
+
+        with self._lock:
+            for n, key in enumerate(keys):
+                if(key in cache):
+                    cache.move_to_end(key)
+                    flat_value[n] = cache[key]
+                else:
+                    missed.append(n)
+
+            self.hits += len(keys) - len(missed)
+            self.misses += len(missed)
+
+        if(missed):
+            missed = np.array(missed)
+
+            flat_value[missed] = getattr(self.fluid, method)(x1.ravel()[missed], x2.ravel()[missed])
+
+            with self._lock:
+                for n in missed.tolist():
+                    self._store(keys[n], flat_value[n].item())
+
+        return value[()] if dtype is not state_dtype else value
+
+    def rho_from_T_P(self, T: float, P: float) -> float:
+        return self._cached("rho_from_T_P", T, P)
+
+    def cp_from_T_P(self, T: float, P: float) -> float:
+        return self._cached("cp_from_T_P", T, P)
+
+    def mu_from_T_P(self, T: float, P: float) -> float:
+        return self._cached("mu_from_T_P", T, P)
+
+    def k_from_T_P(self, T: float, P: float) -> float:
+        return self._cached("k_from_T_P", T, P)
+
+    def e_from_T_P(self, T: float, P: float) -> float:
+        return self._cached("e_from_T_P", T, P)
+
+    def T_from_e_P(self, e: float, P: float) -> float:
+        # T_from_e_P_guess is left to the default. The guess only speeds up
+        # the wrapped fluid, so it is not part of the key and is not passed
+        # on.
+        return self._cached("T_from_e_P", e, P)
+
+    def state_from_T_P(self, T: float, P: float) -> np.ndarray:
+        return self._cached("state_from_T_P", T, P, dtype=state_dtype)
+
+    def clear(self):
+        """ Empties the cache and resets the counters. """
+        with self._lock:
+            self._cache.clear()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> dict:
+        """ Returns the cache counters, the number of entries and the hit
+        rate as a dict.
+        """
+        calls = self.hits + self.misses
+
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self._cache), "hit_rate": self.hits/calls if calls else 0.0}
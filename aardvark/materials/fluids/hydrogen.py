@@ -1,5 +1,10 @@
-from aardvark.base.fluid import Fluid
+from aardvark.base.fluid import Fluid, state_dtype
+from aardvark.materials.fluids.inverse_eos import InverseEOS
 
+import threading
+
+import numpy as np
+import CoolProp.CoolProp as CoolProp
 from CoolProp.CoolProp import PropsSI
 
 
@@ -7,31 +12,146 @@ class Hydrogen(Fluid):
 
     fluid_name = "Hydrogen"
 
+    # Range of the inverse equation of state. The (P, T) flash holds well
+    # past the 1500 K limit of the (P, U) flash. 20 K is above the melting
+    # line up to 20 MPa.
+    T_min_inverse = 20.0
+    T_max_inverse = 5000.0
+    P_min_inverse = 1e4
+    P_max_inverse = 2e7
+
+    @property
+    def abstract_state(self):
+        # CoolProp low level states are not thread safe, so every thread
+        # gets its own.
+        abstract_state = getattr(self._local, "abstract_state", None)
+
+        if(abstract_state is None):
+            abstract_state = CoolProp.AbstractState("HEOS", self.fluid_name)
+            self._local.abstract_state = abstract_state
+
+        return abstract_state
+
+    def __init__(self):
+        self._local = threading.local()
+
+        # Built on the first call to T_from_e_P.
+        self.inverse_eos = None
+
+    def __getstate__(self):
+        # Low level states can not be pickled. They are recreated on first
+        # use after unpickling, e.g. in a worker process.
+        state = self.__dict__.copy()
+        del state["_local"]
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _evaluate(self, input_pair: int, x1, x2, output: str) -> np.ndarray:
+        # Updates the low level state once per element of the broadcast
+        # inputs and reads one output. Scalars in give a scalar out.
+        x1, x2 = np.broadcast_arrays(np.asarray(x1, dtype=float), np.asarray(x2, dtype=float))
+
+        value = np.empty(x1.shape)
+        flat_value = value.reshape(-1)
+
+        abstract_state = self.abstract_state
+        get_output = getattr(abstract_state, output)
+
+        for n, (x1_n, x2_n) in enumerate(zip(x1.ravel(), x2.ravel())):
+            abstract_state.update(input_pair, x1_n, x2_n)
+
+            flat_value[n] = get_output()
+
+        return value[()]
+
     def rho_from_T_P(self, T: float, P: float) -> float:
-        return PropsSI("D", "T", T, "P", P, self.fluid_name)
+        return self._evaluate(CoolProp.PT_INPUTS, P, T, "rhomass")
     
     def cp_from_T_P(self, T: float, P: float) -> float:
-        print(T, P)
-        return PropsSI("C", "T", T, "P", P, self.fluid_name)
+        return self._evaluate(CoolProp.PT_INPUTS, P, T, "cpmass")
 
     def mu_from_T_P(self, T: float, P: float) -> float:
-        print(T, P)
-        return PropsSI("V", "T", T, "P", P, self.fluid_name)
+        return self._evaluate(CoolProp.PT_INPUTS, P, T, "viscosity")
 
     def k_from_T_P(self, T: float, P: float) -> float:
-        print(T, P)
-        return PropsSI("L", "T", T, "P", P, self.fluid_name)
+        return self._evaluate(CoolProp.PT_INPUTS, P, T, "conductivity")
 
     def e_from_T_P(self, T: float, P: float) -> float:
-        print(T, P)
-        return PropsSI("U", "T", T, "P", P, self.fluid_name)
+        return self._evaluate(CoolProp.PT_INPUTS, P, T, "umass")
+
+    def e_dedT_from_T_P(self, T: float, P: float) -> tuple:
+        abstract_state = self.abstract_state
+
+        if(type(T) is float and type(P) is float):
+            abstract_state.update(CoolProp.PT_INPUTS, P, T)
+
+            return abstract_state.umass(), abstract_state.first_partial_deriv(CoolProp.iUmass, CoolProp.iT, CoolProp.iP)
+
+        T, P = np.broadcast_arrays(np.asarray(T, dtype=float), np.asarray(P, dtype=float))
+
+        e = np.empty(T.shape)
+        dedT = np.empty(T.shape)
+
+        flat_e = e.reshape(-1)
+        flat_dedT = dedT.reshape(-1)
+
+        for n, (T_n, P_n) in enumerate(zip(T.ravel(), P.ravel())):
+            abstract_state.update(CoolProp.PT_INPUTS, P_n, T_n)
+
+            flat_e[n] = abstract_state.umass()
+            flat_dedT[n] = abstract_state.first_partial_deriv(CoolProp.iUmass, CoolProp.iT, CoolProp.iP)
+
+        return e[()], dedT[()]
 
     def T_from_e_P(self, e: float, P: float) -> float:
-        # if(e>15695007):
-        #     e_prop = 15695007
-        # else:
-        #     e_prop = e
-        return PropsSI("T", "U", e, "P", P, self.fluid_name)
+        return self.T_from_e_P_guess(e, P, None)
+
+    def T_from_e_P_guess(self, e: float, P: float, T_guess: float) -> float:
+        # Newton iterations on (P, T) flashes replace the iterative (P, U)
+        # flash. Energies past the range of the iterates are extrapolated
+        # linearly rather than clamped. The (P, U) flash is only used for
+        # states Newton did not converge, e.g. across the saturation line.
+        if(self.inverse_eos is None):
+            self.inverse_eos = InverseEOS(self, self.T_min_inverse, self.T_max_inverse,
+                                          self.P_min_inverse, self.P_max_inverse)
+
+        T = self.inverse_eos.T_from_e_P(e, P, T_guess)
+
+        failed = np.isnan(T)
+
+        if(np.ndim(T) == 0):
+            return self._evaluate(CoolProp.PUmass_INPUTS, P, e, "T") if failed else T
+
+        if(np.any(failed)):
+            e, P = np.broadcast_arrays(np.asarray(e, dtype=float), np.asarray(P, dtype=float))
+
+            T = np.array(T)
+            T[failed] = self._evaluate(CoolProp.PUmass_INPUTS, P[failed], e[failed], "T")
+
+        return T[()]
+
+    def state_from_T_P(self, T: float, P: float) -> np.ndarray:
+        # One low level flash per state gives every property. The Python
+        # wrapper has no vectorized AbstractState.update and looping over the
+        # low level state is faster than PropsSImulti, so arrays are looped.
+        T, P = np.broadcast_arrays(np.asarray(T, dtype=float), np.asarray(P, dtype=float))
+
+        state = np.empty(T.shape, dtype=state_dtype)
+        flat_state = state.reshape(-1)
+
+        abstract_state = self.abstract_state
+
+        for n, (T_n, P_n) in enumerate(zip(T.ravel(), P.ravel())):
+            abstract_state.update(CoolProp.PT_INPUTS, P_n, T_n)
+
+            flat_state[n] = (abstract_state.rhomass(), abstract_state.cpmass(), abstract_state.viscosity(),
+                             abstract_state.conductivity(), abstract_state.umass())
+
+        return state
     
     def T_max(self):
-        return PropsSI("TMAX", self.fluid_name)
\ No newline at end of file
+        return PropsSI("TMAX", self.fluid_name)
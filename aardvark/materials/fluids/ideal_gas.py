@@ -1,6 +1,6 @@
-from aardvark.base.fluid import Fluid
+from aardvark.base.fluid import Fluid, state_dtype
 
-from CoolProp.CoolProp import PropsSI
+import numpy as np
 
 
 class IdealGas(Fluid):
@@ -19,19 +19,42 @@ class IdealGas(Fluid):
         self.cv = self.cp - self.R
 
     def rho_from_T_P(self, T: float, P: float) -> float:
-        return P/(self.R*T)
+        T, P = np.broadcast_arrays(T, P)
+
+        return (P/(self.R*T))[()]
     
     def cp_from_T_P(self, T: float, P: float) -> float:
-        return self.cp
+        return np.full(np.broadcast_shapes(np.shape(T), np.shape(P)), self.cp)[()]
 
     def mu_from_T_P(self, T: float, P: float) -> float:
-        return self.mu
+        return np.full(np.broadcast_shapes(np.shape(T), np.shape(P)), self.mu)[()]
 
     def k_from_T_P(self, T: float, P: float) -> float:
-        return self.k
+        return np.full(np.broadcast_shapes(np.shape(T), np.shape(P)), self.k)[()]
 
     def e_from_T_P(self, T: float, P: float) -> float:
-        return self.cv*T
+        T, P = np.broadcast_arrays(T, P)
+
+        return (self.cv*T)[()]
 
     def T_from_e_P(self, e: float, P: float) -> float:
-        return e/self.cv
\ No newline at end of file
+        e, P = np.broadcast_arrays(e, P)
+
+        return (e/self.cv)[()]
+
+    def e_dedT_from_T_P(self, T: float, P: float) -> tuple:
+        T, P = np.broadcast_arrays(T, P)
+
+        return (self.cv*T)[()], np.full(T.shape, self.cv)[()]
+
+    def state_from_T_P(self, T: float, P: float) -> np.ndarray:
+        T, P = np.broadcast_arrays(np.asarray(T, dtype=float), np.asarray(P, dtype=float))
+
+        state = np.empty(T.shape, dtype=state_dtype)
+        state["rho"] = P/(self.R*T)
+        state["cp"] = self.cp
+        state["mu"] = self.mu
+        state["k"] = self.k
+        state["e"] = self.cv*T
+
+        return state
\ No newline at end of file
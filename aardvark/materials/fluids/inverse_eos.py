@@ -0,0 +1,190 @@
+import numpy as np
+
+
+def invert_isobars(e_table: np.ndarray, T_grid: np.ndarray, n_e: int) -> tuple:
+    """ Inverts a table of e(T, P) of shape (n_T, n_P) into a table of
+    T(e, P) of shape (n_e, n_P) on an energy grid that is uniform between the
+    lowest and highest energy of the table.
+
+    e is monotonic in T along each isobar, so each column is a 1D
+    interpolation. Energies outside of an isobar are linearly extrapolated
+    from its end points.
+
+    Returns e_min, e_max and the inverse table.
+    """
+    n_P = e_table.shape[1]
+
+    e_min = np.min(e_table[0])
+    e_max = np.max(e_table[-1])
+
+    e_grid = np.linspace(e_min, e_max, n_e)
+
+    inverse = np.empty((n_e, n_P))
+    for j in range(n_P):
+        inverse[:, j] = np.interp(e_grid, e_table[:, j], T_grid, left=np.nan, right=np.nan)
+
+        low = e_grid < e_table[0, j]
+        high = e_grid > e_table[-1, j]
+
+        slope_low = (T_grid[1] - T_grid[0]) / (e_table[1, j] - e_table[0, j])
+        slope_high = (T_grid[-1] - T_grid[-2]) / (e_table[-1, j] - e_table[-2, j])
+
+        inverse[low, j] = T_grid[0] + slope_low*(e_grid[low] - e_table[0, j])
+        inverse[high, j] = T_grid[-1] + slope_high*(e_grid[high] - e_table[-1, j])
+
+    return e_min, e_max, inverse
+
+
+class InverseEOS:
+    """ Solves T(e, P) by Newton iteration on the forward equation of state
+    e(T, P) of a fluid.
+
+    Each iteration costs one (T, P) flash of the fluid through
+    e_dedT_from_T_P, which for CoolProp fluids is roughly ten times cheaper
+    than the iterative (P, U) flash. Iterations start from a temperature
+    guess when the caller has one, such as the temperature of the previous
+    iteration, and otherwise from a coarse inverse table built once on a grid
+    uniform in log(T) and log(P).
+
+    Newton iterates are kept inside [T_min, T_max]. States whose energy is
+    beyond the energy at a bound are answered by extrapolating linearly from
+    the bound with de/dT there, instead of being clamped or raising. States
+    that do not converge in max_iter iterations are returned as NaN so the
+    owning fluid can fall back to another method for them.
+
+    Attributes
+    ----------
+    fluid : Fluid
+        Fluid whose e(T, P) is inverted.
+
+    T_min, T_max : float
+        Temperature range of the Newton iterates and of the seed table in
+        [K].
+
+    P_min, P_max : float
+        Pressure range of the seed table in [Pa]. Pressures outside of it
+        are seeded from the edge of the table.
+
+    tol : float
+        Relative temperature change at which an iterate is converged.
+
+    max_iter : int
+        Maximum number of Newton iterations.
+
+    """
+
+    def __init__(self, fluid, T_min: float, T_max: float, P_min: float, P_max: float,
+                 n_T: int = 100, n_P: int = 30, n_e: int = 200, tol: float = 1e-10, max_iter: int = 20):
+        self.fluid = fluid
+
+        self.T_min = float(T_min)
+        self.T_max = float(T_max)
+        self.P_min = float(P_min)
+        self.P_max = float(P_max)
+
+        self.tol = tol
+        self.max_iter = max_iter
+
+        T_grid = np.exp(np.linspace(np.log(T_min), np.log(T_max), n_T))
+        P_grid = np.exp(np.linspace(np.log(P_min), np.log(P_max), n_P))
+
+        T, P = np.meshgrid(T_grid, P_grid, indexing="ij")
+
+        e_table = np.reshape(fluid.e_from_T_P(T.ravel(), P.ravel()), (n_T, n_P))
+
+        self.e_min, self.e_max, self.inverse = invert_isobars(e_table, T_grid, n_e)
+
+        self.de = (self.e_max - self.e_min) / (n_e - 1)
+        self.dlnP = (np.log(self.P_max) - np.log(self.P_min)) / (n_P - 1)
+
+    def seed(self, e: np.ndarray, P: np.ndarray) -> np.ndarray:
+        """ Returns the bilinear interpolation of the coarse inverse table. """
+        n_e, n_P = self.inverse.shape
+
+        fe = (e - self.e_min) / self.de
+        fP = (np.log(P) - np.log(self.P_min)) / self.dlnP
+
+        i = np.clip(np.floor(fe).astype(int), 0, n_e - 2)
+        j = np.clip(np.floor(fP).astype(int), 0, n_P - 2)
+
+        te = fe - i
+        tP = np.clip(fP - j, 0, 1)
+
+        T = ((1 - te)*(1 - tP)*self.inverse[i, j] + te*(1 - tP)*self.inverse[i + 1, j]
+             + (1 - te)*tP*self.inverse[i, j + 1] + te*tP*self.inverse[i + 1, j + 1])
+
+        return np.clip(T, self.T_min, self.T_max)
+
+    def _T_from_e_P_scalar(self, e: float, P: float, T_guess: float = None) -> float:
+        # Same iteration as T_from_e_P without the array overhead, which
+        # dominates for the scalar calls of a node by node march.
+        if(T_guess is None):
+            T = float(self.seed(e, P))
+        else:
+            T = min(max(float(T_guess), self.T_min), self.T_max)
+
+        e_dedT_from_T_P = self.fluid.e_dedT_from_T_P
+
+        for _ in range(self.max_iter):
+            e_T, dedT = e_dedT_from_T_P(T, P)
+
+            T_new = T - (e_T - e)/dedT
+
+            if((T == self.T_max and T_new > self.T_max) or (T == self.T_min and T_new < self.T_min)):
+                return T_new
+
+            T_new = min(max(T_new, self.T_min), self.T_max)
+
+            if(abs(T_new - T) <= self.tol*T):
+                return T_new
+
+            T = T_new
+
+        return np.nan
+
+    def T_from_e_P(self, e, P, T_guess=None):
+        if(np.ndim(e) == 0 and np.ndim(P) == 0 and np.ndim(T_guess) == 0):
+            return self._T_from_e_P_scalar(float(e), float(P), T_guess)
+
+        e, P = np.broadcast_arrays(np.asarray(e, dtype=float), np.asarray(P, dtype=float))
+
+        if(T_guess is None):
+            T = self.seed(e, P)
+        else:
+            T = np.clip(np.broadcast_to(np.asarray(T_guess, dtype=float), e.shape), self.T_min, self.T_max)
+
+        shape = e.shape
+
+        T = np.array(T, dtype=float).reshape(-1)
+        e = e.reshape(-1)
+        P = P.reshape(-1)
+
+        converged = np.zeros(T.shape, dtype=bool)
+
+        # Indices of the states that are still being iterated.
+        j = np.arange(T.size)
+
+        for _ in range(self.max_iter):
+            e_j, dedT_j = self.fluid.e_dedT_from_T_P(T[j], P[j])
+
+            T_new = T[j] - (e_j - e[j])/dedT_j
+
+            # An unclipped step from a bound is the linear extrapolation
+            # beyond it, so states past a bound finish there.
+            at_bound = ((T[j] == self.T_max) & (T_new > self.T_max)) | ((T[j] == self.T_min) & (T_new < self.T_min))
+
+            T_clipped = np.clip(T_new, self.T_min, self.T_max)
+
+            done = at_bound | (np.abs(T_clipped - T[j]) <= self.tol*T[j])
+
+            T[j] = np.where(at_bound, T_new, T_clipped)
+            converged[j[done]] = True
+
+            j = j[~done]
+
+            if(j.size == 0):
+                break
+
+        T[~converged] = np.nan
+
+        return T.reshape(shape)[()]
@@ -0,0 +1,243 @@
+from aardvark.base.fluid import Fluid, state_dtype
+from aardvark.materials.fluids.inverse_eos import invert_isobars
+
+import json
+import os
+
+import numpy as np
+
+
+class TabulatedFluid(Fluid):
+    """ Fluid properties interpolated from tables built once from another
+    fluid, typically a CoolProp backed fluid such as Hydrogen.
+
+    rho, cp, mu, k and e are tabulated on a grid that is uniform in log(T)
+    and log(P), which keeps cells small near the critical point. The inverse
+    T(e, P) is tabulated on a grid that is uniform in e and log(P) and is
+    polished with Newton steps on the forward e table so that T_from_e_P and
+    e_from_T_P are consistent with each other.
+    All lookups are bilinear, accept arrays of any shape and return arrays of
+    the same shape. States outside of the table are linearly extrapolated
+    from the edge cells.
+
+    Tables are saved to a directory of raw .npy files which are memory-mapped
+    when loaded, so many processes can share one copy of the tables.
+
+    Attributes
+    ----------
+    fluid_name : str
+        Name of the fluid the tables were built from.
+
+    T_min, T_max : float
+        Temperature range of the tables in [K].
+
+    P_min, P_max : float
+        Pressure range of the tables in [Pa].
+
+    forward : np.ndarray
+        Forward tables of shape (5, n_T, n_P) holding rho, cp, mu, k and e.
+
+    inverse : np.ndarray
+        Inverse table of shape (n_e, n_P) holding T.
+
+    """
+
+    properties = ("rho", "cp", "mu", "k", "e")
+
+    def __init__(self, fluid_name: str, T_min: float, T_max: float, P_min: float, P_max: float,
+                 e_min: float, e_max: float, forward: np.ndarray, inverse: np.ndarray):
+        self.fluid_name = fluid_name
+
+        self.T_min = float(T_min)
+        self.T_max = float(T_max)
+        self.P_min = float(P_min)
+        self.P_max = float(P_max)
+        self.e_min = float(e_min)
+        self.e_max = float(e_max)
+
+        self.forward = forward
+        self.inverse = inverse
+
+        n_T = forward.shape[1]
+        n_P = forward.shape[2]
+        n_e = inverse.shape[0]
+
+        self.dlnT = (np.log(self.T_max) - np.log(self.T_min)) / (n_T - 1)
+        self.dlnP = (np.log(self.P_max) - np.log(self.P_min)) / (n_P - 1)
+        self.de = (self.e_max - self.e_min) / (n_e - 1)
+
+    @classmethod
+    def build(cls, source: Fluid, T_min: float = 40, T_max: float = 3000, P_min: float = 1e5,
+              P_max: float = 1e7, n_T: int = 600, n_P: int = 80, n_e: int = 600):
+        """ Builds tables by evaluating the source fluid on the grid.
+
+        The source must accept arrays in its *_from_T_P methods.
+        """
+        T_grid = np.exp(np.linspace(np.log(T_min), np.log(T_max), n_T))
+        P_grid = np.exp(np.linspace(np.log(P_min), np.log(P_max), n_P))
+
+        T, P = np.meshgrid(T_grid, P_grid, indexing="ij")
+        T = T.ravel()
+        P = P.ravel()
+
+        forward = np.empty((len(cls.properties), n_T, n_P))
+        forward[0] = np.reshape(source.rho_from_T_P(T, P), (n_T, n_P))
+        forward[1] = np.reshape(source.cp_from_T_P(T, P), (n_T, n_P))
+        forward[2] = np.reshape(source.mu_from_T_P(T, P), (n_T, n_P))
+        forward[3] = np.reshape(source.k_from_T_P(T, P), (n_T, n_P))
+        forward[4] = np.reshape(source.e_from_T_P(T, P), (n_T, n_P))
+
+        e_min, e_max, inverse = invert_isobars(forward[4], T_grid, n_e)
+
+        fluid_name = getattr(source, "fluid_name", "")
+
+        return cls(fluid_name, T_min, T_max, P_min, P_max, e_min, e_max, forward, inverse)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True):
+        """ Loads tables saved with save. The tables are memory-mapped
+        read-only unless mmap is False.
+        """
+        with open(os.path.join(path, "grid.json"), "r") as file:
+            grid = json.load(file)
+
+        mmap_mode = "r" if mmap else None
+
+        forward = np.load(os.path.join(path, "forward.npy"), mmap_mode=mmap_mode)
+        inverse = np.load(os.path.join(path, "inverse.npy"), mmap_mode=mmap_mode)
+
+        return cls(grid["fluid_name"], grid["T_min"], grid["T_max"], grid["P_min"], grid["P_max"],
+                   grid["e_min"], grid["e_max"], forward, inverse)
+
+    def save(self, path: str):
+        """ Saves the tables to the directory path as raw .npy files plus a
+        small grid.json describing the axes.
+        """
+        os.makedirs(path, exist_ok=True)
+
+        np.save(os.path.join(path, "forward.npy"), np.ascontiguousarray(self.forward))
+        np.save(os.path.join(path, "inverse.npy"), np.ascontiguousarray(self.inverse))
+
+        grid = {"fluid_name": self.fluid_name,
+                "T_min": self.T_min, "T_max": self.T_max,
+                "P_min": self.P_min, "P_max": self.P_max,
+                "e_min": self.e_min, "e_max": self.e_max}
+
+        with open(os.path.join(path, "grid.json"), "w") as file:
+            json.dump(grid, file, indent=4)
+
+    def _cell(self, x: np.ndarray, x_min: float, dx: float, n: int) -> tuple:
+        # Index of the lower cell node and the fractional position within the
+        # cell. Edge cells are used beyond the table for linear extrapolation.
+        fx = (x - x_min) / dx
+        i = np.clip(np.floor(fx).astype(int), 0, n - 2)
+
+        return i, fx - i
+
+    def _lookup(self, table: np.ndarray, x: np.ndarray, x_min: float, dx: float,
+                y: np.ndarray, y_min: float, dy: float) -> np.ndarray:
+        i, tx = self._cell(x, x_min, dx, table.shape[-2])
+        j, ty = self._cell(y, y_min, dy, table.shape[-1])
+
+        return ((1 - tx)*(1 - ty)*table[..., i, j] + tx*(1 - ty)*table[..., i + 1, j]
+                + (1 - tx)*ty*table[..., i, j + 1] + tx*ty*table[..., i + 1, j + 1])
+
+    def _forward(self, index, T, P) -> np.ndarray:
+        T, P = np.broadcast_arrays(np.asarray(T, dtype=float), np.asarray(P, dtype=float))
+
+        value = self._lookup(self.forward[index], np.log(T), np.log(self.T_min), self.dlnT,
+                             np.log(P), np.log(self.P_min), self.dlnP)
+
+        return value[()]
+
+    def rho_from_T_P(self, T: float, P: float) -> float:
+        return self._forward(0, T, P)
+
+    def cp_from_T_P(self, T: float, P: float) -> float:
+        return self._forward(1, T, P)
+
+    def mu_from_T_P(self, T: float, P: float) -> float:
+        return self._forward(2, T, P)
+
+    def k_from_T_P(self, T: float, P: float) -> float:
+        return self._forward(3, T, P)
+
+    def e_from_T_P(self, T: float, P: float) -> float:
+        return self._forward(4, T, P)
+
+    def state_from_T_P(self, T: float, P: float) -> np.ndarray:
+        # The cell lookup is shared by every property.
+        T, P = np.broadcast_arrays(np.asarray(T, dtype=float), np.asarray(P, dtype=float))
+
+        values = self._lookup(self.forward, np.log(T), np.log(self.T_min), self.dlnT,
+                              np.log(P), np.log(self.P_min), self.dlnP)
+
+        state = np.empty(T.shape, dtype=state_dtype)
+        for name, value in zip(self.properties, values):
+            state[name] = value
+
+        return state
+
+    def T_from_e_P(self, e: float, P: float) -> float:
+        e, P = np.broadcast_arrays(np.asarray(e, dtype=float), np.asarray(P, dtype=float))
+
+        lnP = np.log(P)
+
+        T = self._lookup(self.inverse, e, self.e_min, self.de, lnP, np.log(self.P_min), self.dlnP)
+
+        # Newton polish on the forward table. e is piecewise linear in log(T)
+        # within a cell so the slope of the cell is the exact derivative.
+        e_table = self.forward[4]
+
+        j, ty = self._cell(lnP, np.log(self.P_min), self.dlnP, e_table.shape[1])
+
+        for _ in range(2):
+            lnT = np.log(np.maximum(T, self.T_min*1e-3))
+
+            i, tx = self._cell(lnT, np.log(self.T_min), self.dlnT, e_table.shape[0])
+
+            e_low = (1 - ty)*e_table[i, j] + ty*e_table[i, j + 1]
+            e_high = (1 - ty)*e_table[i + 1, j] + ty*e_table[i + 1, j + 1]
+
+            de_dlnT = (e_high - e_low) / self.dlnT
+
+            T = np.exp(lnT - ((1 - tx)*e_low + tx*e_high - e) / de_dlnT)
+
+        return T[()]
+
+    def accuracy_report(self, source: Fluid, n_samples: int = 2000, seed: int = 0) -> str:
+        """ Compares the tables against direct calls to the source fluid at
+        random states inside the table range and returns a text report of the
+        maximum and mean relative error of each property.
+        """
+        rng = np.random.default_rng(seed)
+
+        T = rng.uniform(self.T_min, self.T_max, n_samples)
+        P = np.exp(rng.uniform(np.log(self.P_min), np.log(self.P_max), n_samples))
+
+        reference = {"rho": source.rho_from_T_P(T, P),
+                     "cp": source.cp_from_T_P(T, P),
+                     "mu": source.mu_from_T_P(T, P),
+                     "k": source.k_from_T_P(T, P),
+                     "e": source.e_from_T_P(T, P)}
+
+        tabulated = {"rho": self.rho_from_T_P(T, P),
+                     "cp": self.cp_from_T_P(T, P),
+                     "mu": self.mu_from_T_P(T, P),
+                     "k": self.k_from_T_P(T, P),
+                     "e": self.e_from_T_P(T, P)}
+
+        # The inverse is checked on T recovered from the exact energy.
+        reference["T(e, P)"] = T
+        tabulated["T(e, P)"] = self.T_from_e_P(reference["e"], P)
+
+        lines = ["TabulatedFluid accuracy for \"" + self.fluid_name + "\" (" + str(n_samples) + " random states)",
+                 "T = [%g, %g] K, P = [%g, %g] Pa" % (self.T_min, self.T_max, self.P_min, self.P_max),
+                 "%-10s %-14s %-14s" % ("Property", "Max Rel Err", "Mean Rel Err")]
+
+        for name in reference:
+            error = np.abs(tabulated[name] - reference[name]) / np.abs(reference[name])
+
+            lines.append("%-10s %-14.3E %-14.3E" % (name, np.max(error), np.mean(error)))
+
+        return "\n".join(lines)
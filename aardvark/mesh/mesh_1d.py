@@ -29,7 +29,7 @@ class Mesh1D:
     def dx(self) -> np.ndarray:
         return self._dx
     
-    @cells.setter
+    @dx.setter
     def dx(self, new_dx: np.ndarray):
         Log.error("Mesh1D :: Tried to set dx directly. Only nodes can be set directly.")
 
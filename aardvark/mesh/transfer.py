@@ -0,0 +1,155 @@
+from aardvark.base.log import Log
+from aardvark.mesh.mesh_1d import Mesh1D
+
+import numpy as np
+
+
+kinds = ("interpolate", "conservative", "conservative_total")
+
+def locations(mesh: Mesh1D, var_type: str) -> np.ndarray:
+    """ Returns the x of the values of a variable on mesh. """
+    return mesh.nodes if var_type == "node" else mesh.cells
+
+def edges(mesh: Mesh1D, var_type: str) -> np.ndarray:
+    """ Returns the edges of the intervals the values of a variable on mesh
+    stand for. Cell values stand for their cell and node values for the
+    half cells on either side of the node.
+    """
+    if(var_type == "node"):
+        return np.concatenate(([mesh.nodes[0]], mesh.cells, [mesh.nodes[-1]]))
+
+    return mesh.nodes
+
+def interpolation_matrix(x_source: np.ndarray, x_target: np.ndarray):
+    """ Returns the sparse matrix of linear interpolation from values at
+    x_source to values at x_target. Targets outside of the source range take
+    the nearest source value.
+    """
+    import scipy.sparse
+
+    n_source = x_source.size
+    n_target = x_target.size
+
+    if(n_source == 1):
+        return scipy.sparse.csr_matrix(np.ones((n_target, 1)))
+
+    i = np.clip(np.searchsorted(x_source, x_target, side="right") - 1, 0, n_source - 2)
+    w = np.clip((x_target - x_source[i])/(x_source[i + 1] - x_source[i]), 0, 1)
+
+    rows = np.concatenate((np.arange(n_target), np.arange(n_target)))
+    columns = np.concatenate((i, i + 1))
+    weights = np.concatenate((1 - w, w))
+
+    return scipy.sparse.csr_matrix((weights, (rows, columns)), shape=(n_target, n_source))
+
+def overlap_matrix(edges_source: np.ndarray, edges_target: np.ndarray):
+    """ Returns the sparse matrix of the overlap lengths of the target
+    intervals (rows) with the source intervals (columns).
+    """
+    import scipy.sparse
+
+    n_source = edges_source.size - 1
+    n_target = edges_target.size - 1
+
+    # Every piece between two consecutive edges of either mesh lies in one
+    # interval of each mesh.
+    breaks = np.union1d(edges_source, edges_target)
+
+    length = np.diff(breaks)
+    middle = 0.5*(breaks[1:] + breaks[:-1])
+
+    i = np.searchsorted(edges_source, middle, side="right") - 1
+    j = np.searchsorted(edges_target, middle, side="right") - 1
+
+    inside = (i >= 0) & (i < n_source) & (j >= 0) & (j < n_target) & (length > 0)
+
+    return scipy.sparse.csr_matrix((length[inside], (j[inside], i[inside])), shape=(n_target, n_source))
+
+class Transfer:
+    """ Linear map of the values of a Mesh1DVar onto the mesh of another,
+    built once as a sparse matrix so that each transfer is one mat-vec.
+
+    kind is one of
+
+        "interpolate"
+            Linear interpolation between the node or cell centre locations.
+
+        "conservative"
+            For values that are averages over their interval, e.g. a
+            temperature or a linear power in W/m. Each target value is the
+            average of the source values over the part of its interval the
+            source covers, which keeps the integral of the values over
+            target intervals the source covers fully. Targets the source
+            does not reach hold the nearest source value, as with
+            "interpolate".
+
+        "conservative_total"
+            For values that are totals over their interval, e.g. the power
+            of each cell in W. Each source value is split over the targets
+            in proportion to the overlap, which keeps the sum of the values
+            over the overlap of the meshes.
+
+    Values of shape (n_channels, N) are transferred channel by channel.
+
+    Attributes
+    ----------
+    kind : str
+        Kind of transfer.
+
+    matrix : scipy.sparse.csr_matrix
+        Matrix of shape (target size, source size).
+
+    """
+
+    def __init__(self, kind: str, source_mesh: Mesh1D, source_type: str, target_mesh: Mesh1D, target_type: str):
+        if(kind not in kinds):
+            Log.error("Unknown transfer \"" + str(kind) + "\". Options are " + ", ".join("\"" + name + "\"" for name in kinds) + ".")
+
+        self.kind = kind
+
+        if(kind == "interpolate"):
+            self.matrix = interpolation_matrix(locations(source_mesh, source_type), locations(target_mesh, target_type))
+
+            return
+
+        edges_source = edges(source_mesh, source_type)
+        edges_target = edges(target_mesh, target_type)
+
+        overlap = overlap_matrix(edges_source, edges_target)
+
+        if(kind == "conservative_total"):
+            lengths = np.diff(edges_source)
+            scale = np.divide(1, lengths, out=np.zeros(lengths.size), where=lengths > 0)
+
+            self.matrix = overlap.multiply(scale[None, :]).tocsr()
+
+            return
+
+        # Averages are taken over the covered length of each target, so
+        # targets at the ends of a shorter source are not scaled down.
+        covered = np.asarray(overlap.sum(axis=1)).ravel()
+        scale = np.divide(1, covered, out=np.zeros(covered.size), where=covered > 0)
+
+        matrix = overlap.multiply(scale[:, None]).tocsr()
+
+        uncovered = covered <= 0
+
+        if(np.any(uncovered)):
+            import scipy.sparse
+
+            nearest = interpolation_matrix(locations(source_mesh, source_type), locations(target_mesh, target_type))
+
+            keep = scipy.sparse.diags((~uncovered).astype(float))
+            hold = scipy.sparse.diags(uncovered.astype(float))
+
+            matrix = (keep @ matrix + hold @ nearest).tocsr()
+
+        self.matrix = matrix
+
+    def apply(self, value: np.ndarray) -> np.ndarray:
+        value = np.asarray(value, dtype=float)
+
+        if(value.ndim == 1):
+            return self.matrix @ value
+
+        return (self.matrix @ value.T).T
@@ -0,0 +1,188 @@
+from aardvark.base.system import System
+from aardvark.base.log import Log
+
+import copy
+from decimal import Decimal
+import numpy as np
+
+
+class NewtonSystemSolver:
+    """ Solves all components of a System together by Jacobian-free
+    Newton-Krylov, instead of iterating the coupled groups one at a time.
+
+    The unknown is the packed state x of every variable, see
+    System.get_state. One sweep over the schedule solves every component once
+    from x and gives G(x), so the coupled solution is the root of
+    F(x) = x - G(x). Each Newton step solves J dx = -F with GMRES, where the
+    products J v are finite differences of F and cost one sweep each. Steps
+    are halved until |F| decreases, and a plain sweep is taken if none does.
+
+    With preconditioner "sweep" GMRES is preconditioned with I + G', the
+    first terms of the Neumann series of J^-1 = (I - G')^-1, which is applied
+    with one more sweep. It is cheap when the sweeps already converge and
+    makes GMRES converge in few iterations when they converge slowly.
+
+    The state is scaled by its magnitude at the start of the solve so every
+    entry is of order one. Convergence is measured as in System.solve: the
+    summed residual of the components after a sweep must be within tol.
+
+    The finite differences need G to be a function of x alone. Components
+    keep state between solves that changes where their inner iterations
+    start, e.g. the warm_state of FlowChannel1D, so every sweep starts from
+    the checkpoint state the components had at the start of the solve.
+
+    Attributes
+    ----------
+    preconditioner : str
+        "sweep" or None.
+
+    eps : float
+        Relative step of the finite-difference Jacobian-vector products, the
+        step being eps*(1 + |y|) in the scaled state y. None to derive it
+        from the tol of each solve: a summed squared residual within tol
+        leaves values accurate to about sqrt(tol), so F carries a relative
+        noise of about sqrt(tol)/max|x|, and a step of the square root of
+        that noise balances it against the truncation error of the
+        difference. A fixed eps below the noise makes J v mostly noise.
+
+    krylov_tol : float
+        Relative tolerance of the GMRES solve of each Newton step.
+
+    max_krylov : int
+        Maximum number of GMRES iterations per Newton step.
+
+    max_backtracks : int
+        Maximum number of step halvings per Newton step.
+
+    """
+
+    def __init__(self, preconditioner: str = "sweep", eps: float = None, krylov_tol: float = 1e-2,
+                 max_krylov: int = 20, max_backtracks: int = 4):
+        if(preconditioner not in (None, "sweep")):
+            Log.error("Unknown preconditioner \"" + str(preconditioner) + "\". Options are None and \"sweep\".")
+
+        self.preconditioner = preconditioner
+        self.eps = eps
+        self.krylov_tol = krylov_tol
+        self.max_krylov = max_krylov
+        self.max_backtracks = max_backtracks
+
+        self.name = "jfnk" if preconditioner is None else "jfnk+" + preconditioner
+
+    def solve(self, system: System, dt: float, tol: float, max_iter: float) -> bool:
+        # scipy is slow to import and only needed here.
+        import scipy.sparse.linalg
+
+        system.prepare()
+
+        x_0 = system.get_state()
+        scale = np.where(np.abs(x_0) > 0, np.abs(x_0), 1)
+
+        history = {"components": [component.name for group, _ in system._schedule for component in group],
+                   "accel": self.name, "residuals": [], "converged": False, "skipped": 0, "sweeps": 0}
+        system.convergence_history.append(history)
+
+        components = system.components
+        start_states = [component.get_checkpoint_state() for component in components]
+
+        def evaluate(y: np.ndarray) -> tuple:
+            # Sweeps from the state y and returns F(y) and the residual of
+            # the sweep. The state is left at G(y).
+            x = y*scale
+
+            for component, start_state in zip(components, start_states):
+                component.set_checkpoint_state(copy.deepcopy(start_state))
+
+            system.set_state(x, x)
+            system.sweep_schedule(dt)
+
+            history["sweeps"] += 1
+
+            return (x - system.get_state())/scale, system.residual()
+
+        if(self.eps is not None):
+            eps = self.eps
+
+        else:
+            noise = np.sqrt(tol)/max(np.max(np.abs(x_0), initial=0), 1)
+            eps = np.sqrt(max(noise, np.finfo(float).eps))
+
+        y = x_0/scale
+        F, res = evaluate(y)
+
+        history["residuals"].append(res)
+
+        Log.line_break()
+        Log.message("Newton-Krylov solve of all components (" + self.name + ").")
+        Log.debug("     %-9s     %-12s     %-6s" % ("Iteration", "Residual", "GMRES"))
+        Log.debug("     %-9s     %-12E" % ("Initial", Decimal(res)))
+
+        i = 0
+
+        while(True):
+            if(res <= tol):
+                Log.message("Newton-Krylov converged in " + str(i) + " iterations.")
+                history["converged"] = True
+                break
+
+            if(i >= max_iter):
+                Log.warning("Max iterations reached without convergence.")
+                break
+
+            norm_F = np.linalg.norm(F)
+            h = eps*(1 + np.linalg.norm(y))
+
+            def J(v: np.ndarray) -> np.ndarray:
+                norm_v = np.linalg.norm(v)
+
+                if(norm_v == 0):
+                    return np.zeros_like(v)
+
+                return (evaluate(y + (h/norm_v)*v)[0] - F)*(norm_v/h)
+
+            A = scipy.sparse.linalg.LinearOperator((y.size, y.size), matvec=J)
+
+            M = None
+            if(self.preconditioner == "sweep"):
+                # (I + G') v = 2v - J v
+                M = scipy.sparse.linalg.LinearOperator((y.size, y.size), matvec=lambda v: 2*v - J(v))
+
+            n_krylov = [0]
+
+            def count(_):
+                n_krylov[0] += 1
+
+            dy, _ = scipy.sparse.linalg.gmres(A, -F, rtol=self.krylov_tol, atol=0, restart=self.max_krylov,
+                                              maxiter=1, M=M, callback=count, callback_type="pr_norm")
+
+            # Halve the step until |F| decreases. Every trial sweeps, so the
+            # state is left at G of the accepted point.
+            step = 1.0
+            accepted = False
+
+            for _ in range(self.max_backtracks + 1):
+                F_new, res_new = evaluate(y + step*dy)
+
+                if(np.all(np.isfinite(F_new)) and np.linalg.norm(F_new) < norm_F):
+                    y = y + step*dy
+                    accepted = True
+                    break
+
+                step *= 0.5
+
+            if(not accepted):
+                Log.warning("No decrease along the Newton step. Taking a sweep instead.")
+
+                y = y - F
+                F_new, res_new = evaluate(y)
+
+            F = F_new
+            res = res_new
+
+            history["residuals"].append(res)
+
+            Log.debug("     %-9i     %-12E     %-6i" % (i, Decimal(res), n_krylov[0]))
+
+            i += 1
+
+        return history["converged"]
@@ -1,7 +1,11 @@
 from aardvark.base.system import System
-from aardvark.base.log import Log
+from aardvark.base.log import Log, Logger
+from aardvark.base.history import HistoryWriter
+from aardvark.base.profiler import Profiler
 
 from decimal import Decimal
+import contextvars
+import numpy as np
 import time
 
 def convert_computation_time(seconds, granularity = 5):
@@ -29,16 +33,96 @@ def convert_computation_time(seconds, granularity = 5):
 
 class TransientSolver:
     def __init__(self, case_name = "Case", system: System = None, 
-                 duration: float = 1, dt: float = 1, tol = 1e-6, max_iter = 100):
+                 duration: float = 1, dt: float = 1, tol = 1e-6, max_iter = 100, accel: str = None,
+                 system_solver = None, adaptive: bool = False, lte_rtol: float = 1e-3, lte_atol: float = 1e-6,
+                 dt_min: float = None, dt_max: float = None, checkpoint_interval: int = None,
+                 restart_from: str = None, history = None, history_chunk: int = 100, profile: bool = False):
+        """ Marches the system from time 0 to duration.
+
+        system_solver solves each time step instead of System.solve when
+        given, e.g. a NewtonSystemSolver. accel is not used then.
+
+        Steps whose coupling iteration reaches max_iter are rejected and
+        retried with half the step. With adaptive, dt is only the first step
+        and each step after the second is sized from an estimate of its
+        local truncation error: the difference between the solution and a
+        linear extrapolation of the last two solutions. Steps whose error
+        is over lte_atol + lte_rtol*|value| for any value are rejected and
+        retried with a smaller step. Steps are kept within [dt_min, dt_max],
+        by default [1e-6*dt, duration].
+
+        With checkpoint_interval, the System and the time loop are saved to
+        checkpoint.npz in the case folder every checkpoint_interval accepted
+        steps. restart_from is the path of a checkpoint to continue from
+        instead of starting at time 0. The restarted run takes the same
+        steps and gives the same values as the run that wrote the
+        checkpoint, as long as no component keeps state outside of its
+        variables and checkpoint state (e.g. a CachedFluid).
+
+        history is a list of variables, or "all", whose values are written
+        after every accepted step to the history folder of the case, in
+        chunks of history_chunk steps. Read it with HistoryReader.
+
+        With profile, the time and counters of every component solve and
+        of every fluid property call are collected in a Profiler, logged
+        and written to profile.json and profile.csv in the case folder.
+        """
         self.case_name = case_name
         self.system = system
         self.duration = duration
         self.dt = dt
         self.tol = tol
         self.max_iter = max_iter
+        self.accel = accel
+        self.system_solver = system_solver
+
+        self.adaptive = adaptive
+        self.lte_rtol = lte_rtol
+        self.lte_atol = lte_atol
+        self.dt_min = dt_min if dt_min is not None else 1e-6*dt
+        self.dt_max = dt_max if dt_max is not None else duration
+
+        # Step size control. The error estimate is first order, so steps
+        # scale with the inverse square root of the error.
+        self.safety = 0.9
+        self.min_factor = 0.2
+        self.max_factor = 2.0
+
+        # One entry per attempted step.
+        self.steps: list[dict] = []
+
+        self.checkpoint_interval = checkpoint_interval
+        self.restart_from = restart_from
+
+        self.history = history
+        self.history_chunk = history_chunk
+
+        self._history_writer: HistoryWriter = None
+
+        self.profile = profile
+        self.profiler: Profiler = None
+
+        # Logger and output folder of the case. Set by solve.
+        self.logger: Logger = None
+        self.output_dir: str = None
 
     def solve(self):
-        System.create_outputs_dir(self.case_name)
+        """ Runs the case in its own context, so that its logger and output
+        folder are its own also when other cases run on other threads of
+        the process.
+        """
+        self.logger = None
+
+        try:
+            contextvars.copy_context().run(self.solve_case)
+
+        finally:
+            if(self.logger is not None):
+                self.logger.close()
+
+    def solve_case(self):
+        self.logger = System.create_outputs_dir(self.case_name)
+        self.output_dir = self.logger.output_dir
 
         Log.message("Setting up system...")
         self.system.setup()
@@ -47,11 +131,190 @@ class TransientSolver:
 
         start_time = time.time()
 
+        if(self.profile):
+            self.profiler = Profiler()
+            self.profiler.attach(self.system.components)
+
+            self.system.profiler = self.profiler
+
+        if(self.history is not None):
+            variables = self.system.all_variables() if self.history == "all" else self.history
+
+            self._history_writer = HistoryWriter(self.output_dir + "/history", variables, self.history_chunk)
+
         Log.line_break()
-        self.system.march()
-        self.system.solve(self.dt, self.tol, self.max_iter)
+
+        try:
+            self.run()
+
+        finally:
+            self.system.close()
+
+            if(self._history_writer is not None):
+                self._history_writer.close()
+
+            if(self.profiler is not None):
+                self.profiler.detach()
+                self.system.profiler = None
+
         Log.line_break()
 
+        if(self.system.convergence_history):
+            Log.message("Convergence history:")
+
+            for line in self.system.convergence_report().splitlines():
+                Log.message("     " + line)
+
+            Log.line_break()
+
+        accepted = sum(step["accepted"] for step in self.steps)
+
+        Log.message(str(accepted) + " time steps accepted and " + str(len(self.steps) - accepted) + " rejected. "
+                    + str(self.coupling_sweeps()) + " coupling sweeps in total.")
+
+        if(self.profiler is not None):
+            self.profiler.steps = [dict(step) for step in self.steps]
+            self.profiler.write(self.output_dir + "/profile")
+
+            Log.message("Profile:")
+
+            for line in self.profiler.summary():
+                Log.message("     " + line)
+
+            Log.line_break()
+
         end_time = time.time()
 
         Log.message("Computation Time was " + convert_computation_time(end_time-start_time))
+
+    def run(self):
+        """ The time loop. """
+        t = 0.0
+        dt = self.dt
+
+        # Last two accepted solutions and the step between them.
+        x = None
+        x_prev = None
+        dt_prev = None
+
+        if(self.restart_from is not None):
+            state = self.system.load_checkpoint(self.restart_from)
+
+            t, dt = state["t"], state["dt"]
+            x, x_prev, dt_prev = state["x"], state["x_prev"], state["dt_prev"]
+
+            self.steps = state["steps"]
+
+            Log.message("Restarted from \"" + self.restart_from + "\" at time " + str(t) + ".")
+
+        n_accepted = sum(step["accepted"] for step in self.steps)
+
+        # Retries after the coupling did not converge start from its last
+        # iterate instead of the initial values, so they make progress also
+        # when the components do not depend on dt.
+        restart = True
+
+        Log.message("     %-6s     %-12s     %-12s     %-10s     %s" % ("Step", "Time", "dt", "Error", "Result"))
+
+        while(self.duration - t > 1e-12*self.duration):
+            dt = min(dt, self.dt_max, self.duration - t)
+
+            n_solves = len(self.system.convergence_history)
+            step_start = time.perf_counter()
+
+            converged = self.solve_step(t, dt, restart)
+
+            wall_time = time.perf_counter() - step_start
+            sweeps = sum(history.get("sweeps", len(history["residuals"])) for history in self.system.convergence_history[n_solves:])
+
+            error = None
+            factor = self.max_factor
+
+            if(converged and self.adaptive and x_prev is not None):
+                error = self.error_norm(self.system.get_state(), x, x_prev, dt, dt_prev)
+                factor = min(self.max_factor, max(self.min_factor, self.safety/max(error, 1e-10)**0.5))
+
+            accepted = converged and (error is None or error <= 1)
+
+            if(not converged):
+                result = "rejected, coupling did not converge"
+            elif(not accepted):
+                result = "rejected, error too large"
+            else:
+                result = "accepted"
+
+            self.steps.append({"time": t + dt, "dt": dt, "error": error, "converged": converged, "accepted": accepted,
+                               "sweeps": sweeps, "wall_time": wall_time})
+
+            Log.message("     %-6i     %-12.6E     %-12.6E     %-10s     %s" % (len(self.steps) - 1, t + dt, dt,
+                                                                            "-" if error is None else "%.3f" % error, result))
+
+            restart = converged or not np.all(np.isfinite(self.system.get_state()))
+
+            if(not accepted):
+                dt = dt*(factor if converged else 0.5)
+
+                if(dt < self.dt_min):
+                    Log.error("Time step fell below dt_min = " + str(self.dt_min) + " at time " + str(t) + ".")
+
+                continue
+
+            t += dt
+
+            self.system.advance()
+
+            x_prev, x = x, self.system.get_state()
+            dt_prev = dt
+
+            if(self.adaptive):
+                dt = dt*factor
+
+            else:
+                dt = self.dt
+
+            n_accepted += 1
+
+            if(self._history_writer is not None):
+                self._history_writer.record(t)
+
+            if(self.checkpoint_interval is not None and n_accepted % self.checkpoint_interval == 0):
+                self.save_checkpoint({"t": t, "dt": dt, "x": x, "x_prev": x_prev, "dt_prev": dt_prev, "steps": self.steps})
+
+    def save_checkpoint(self, state: dict):
+        path = self.output_dir + "/checkpoint.npz"
+
+        self.system.save_checkpoint(path, state)
+
+        Log.message("Wrote checkpoint at time " + str(state["t"]) + ".")
+
+    def solve_step(self, t: float, dt: float, restart: bool = True) -> bool:
+        """ Solves the step from t to t + dt, starting from the initial
+        values if restart and otherwise from the current values. Returns
+        False if the coupling did not converge.
+        """
+        if(restart):
+            self.system.march()
+
+        self.system.set_time(t + dt)
+
+        if(self.system_solver is None):
+            return self.system.solve(dt, self.tol, self.max_iter, self.accel)
+
+        return self.system_solver.solve(self.system, dt, self.tol, self.max_iter)
+
+    def error_norm(self, x_new: np.ndarray, x: np.ndarray, x_prev: np.ndarray, dt: float, dt_prev: float) -> float:
+        """ Returns the estimated local truncation error of x_new relative to
+        the tolerance, so the step is acceptable at 1 or less. The estimate
+        is dt/(dt + dt_prev) times the difference between x_new and the
+        linear extrapolation of x_prev and x.
+        """
+        predicted = x + (dt/dt_prev)*(x - x_prev)
+        error = dt/(dt + dt_prev)*np.abs(x_new - predicted)
+
+        return float(np.max(error/(self.lte_atol + self.lte_rtol*np.abs(x_new)), initial=0))
+
+    def coupling_sweeps(self) -> int:
+        """ Returns the number of sweeps over coupled components in all
+        attempted steps.
+        """
+        return sum(history.get("sweeps", len(history["residuals"])) for history in self.system.convergence_history)
@@ -0,0 +1,142 @@
+""" Conformance and throughput check for the vectorized Fluid contract.
+
+For every fluid backend this checks that each *_from_T_P method,
+T_from_e_P and state_from_T_P
+
+    * return a scalar for scalar inputs,
+    * return an array with the input shape for array inputs of any shape,
+    * give the same values for one array call as for a loop of scalar calls,
+
+and reports the throughput of the array call in seconds per million states.
+
+Run from the repository root:
+
+    python -m benchmarks.fluid_conformance [--states N] [--no-hydrogen]
+
+Exits with a non-zero status if any backend breaks the contract.
+"""
+import aardvark as adv
+from aardvark.base.fluid import Fluid
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+
+methods = ("rho_from_T_P", "cp_from_T_P", "mu_from_T_P", "k_from_T_P", "e_from_T_P")
+
+def build_fluids(include_hydrogen: bool) -> dict:
+    fluids = {"IdealGas": adv.fluids.IdealGas("my_hydrogen", 14290, 0.18, 2.016, 0.88e-5)}
+
+    if(include_hydrogen):
+        hydrogen = adv.fluids.Hydrogen()
+
+        fluids["Hydrogen"] = hydrogen
+        fluids["TabulatedFluid"] = adv.fluids.TabulatedFluid.build(hydrogen, n_T=200, n_P=40, n_e=200)
+
+    return fluids
+
+def random_states(n: int, seed: int = 0) -> tuple:
+    rng = np.random.default_rng(seed)
+
+    T = rng.uniform(100, 3000, n)
+    P = rng.uniform(1e6, 7e6, n)
+
+    return T, P
+
+def check_fluid(fluid: Fluid, n_check: int, rtol: float = 1e-12) -> list:
+    failures = []
+
+    T, P = random_states(n_check)
+    e = fluid.e_from_T_P(T, P)
+
+    calls = [(name, getattr(fluid, name), T, P) for name in methods]
+    calls.append(("T_from_e_P", fluid.T_from_e_P, e, P))
+
+    for name, method, x1, x2 in calls:
+        scalar = method(float(x1[0]), float(x2[0]))
+
+        if(np.ndim(scalar) != 0):
+            failures.append(name + " returned shape " + str(np.shape(scalar)) + " for scalar inputs.")
+
+        array = method(x1, x2)
+        looped = np.array([method(float(a), float(b)) for a, b in zip(x1, x2)])
+
+        if(np.shape(array) != x1.shape):
+            failures.append(name + " returned shape " + str(np.shape(array)) + " for inputs of shape " + str(x1.shape) + ".")
+
+        elif(not np.allclose(array, looped, rtol=rtol, atol=0)):
+            failures.append(name + " array and scalar results differ by up to " + str(np.max(np.abs(array/looped - 1))) + " relative.")
+
+        grid = method(x1.reshape(2, -1), x2.reshape(2, -1))
+
+        if(np.shape(grid) != (2, x1.size // 2)):
+            failures.append(name + " did not preserve a 2D input shape.")
+
+        broadcast = method(x1, float(x2[0]))
+
+        if(np.shape(broadcast) != x1.shape):
+            failures.append(name + " did not broadcast a scalar second argument.")
+
+    state = fluid.state_from_T_P(T, P)
+
+    for field in ("rho", "cp", "mu", "k", "e"):
+        if(not np.allclose(state[field], getattr(fluid, field + "_from_T_P")(T, P), rtol=rtol, atol=0)):
+            failures.append("state_from_T_P field \"" + field + "\" differs from " + field + "_from_T_P.")
+
+    return failures
+
+def throughput(fluid: Fluid, n_states: int) -> dict:
+    T, P = random_states(n_states, seed=1)
+    e = fluid.e_from_T_P(T, P)
+
+    seconds = {}
+
+    calls = [(name, getattr(fluid, name), T, P) for name in methods]
+    calls.append(("T_from_e_P", fluid.T_from_e_P, e, P))
+    calls.append(("state_from_T_P", fluid.state_from_T_P, T, P))
+
+    for name, method, x1, x2 in calls:
+        start = time.perf_counter()
+        method(x1, x2)
+        seconds[name] = (time.perf_counter() - start) * 1e6 / n_states
+
+    return seconds
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--states", type=int, default=100000, help="states per throughput measurement")
+    parser.add_argument("--check-states", type=int, default=200, help="states per conformance check")
+    parser.add_argument("--no-hydrogen", action="store_true", help="skip the CoolProp backed fluids")
+    args = parser.parse_args(argv)
+
+    fluids = build_fluids(not args.no_hydrogen)
+
+    failed = False
+
+    for fluid_name, fluid in fluids.items():
+        failures = check_fluid(fluid, args.check_states)
+
+        print(fluid_name + ": " + ("OK" if not failures else "FAILED"))
+        for failure in failures:
+            print("    " + failure)
+
+        failed = failed or bool(failures)
+
+    print("")
+    print("Seconds per million states (%i states per call)" % args.states)
+
+    rows = {fluid_name: throughput(fluid, args.states) for fluid_name, fluid in fluids.items()}
+
+    names = list(next(iter(rows.values())).keys())
+
+    print("%-16s" % "Method" + "".join("%-16s" % fluid_name for fluid_name in rows))
+    for name in names:
+        print("%-16s" % name + "".join("%-16.4f" % rows[fluid_name][name] for fluid_name in rows))
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,259 @@
+""" Benchmark suite for the thermal-hydraulics hot path.
+
+Times
+
+    * FlowChannel1D.solve against the number of nodes, the heating mode
+      (adiabatic, use_Q_dot, use_T_wall) and the fluid backend (IdealGas,
+      Hydrogen),
+    * System.solve on chains of channels, each feeding the inlet of the
+      next,
+
+and stores the results as a JSON baseline. Each case is timed on fresh
+components, repeated while the time budget of the case allows, and the
+fastest run is kept since it is the least disturbed by the machine.
+
+Run from the repository root:
+
+    python -m benchmarks.hot_path run [--quick] [--no-hydrogen] [--output FILE]
+    python -m benchmarks.hot_path compare BASELINE [CURRENT] [--threshold F]
+
+compare runs the suite with the settings of BASELINE when CURRENT is not
+given, prints the change of every case and exits with a non-zero status if
+any case is slower than the baseline by more than the threshold (0.25 is
+25 %). Baselines only compare across runs on the same machine.
+
+run writes hot_path_current.json next to this file unless --output is
+given. baselines/hot_path.json is a reference baseline made with --quick
+--no-hydrogen and is only read by compare. Its meta entry records the
+machine it was made on. On another machine, write a baseline of your own
+with run --output and compare against that.
+"""
+import aardvark as adv
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+
+hx_types = ("adiabatic", "use_Q_dot", "use_T_wall")
+
+channel_nodes = (10, 100, 1000, 10000)
+chain_lengths = (2, 10, 50, 100, 500)
+
+# Cases beyond these sizes are left out by --quick.
+quick_nodes = 1000
+quick_chain = 100
+
+# Runs shorter than this are too noisy to call a regression.
+noise_floor = 1e-3
+
+root = os.path.dirname(os.path.abspath(__file__))
+
+def build_fluid(name: str):
+    if(name == "IdealGas"):
+        return adv.fluids.IdealGas("my_hydrogen", 14290, 0.18, 2.016, 0.88e-5)
+
+    return adv.fluids.Hydrogen()
+
+def make_channel(name: str, fluid, hx_type: str, N: int, Q_dot: float = 0.18e6/19) -> adv.FlowChannel1D:
+    fc = adv.FlowChannel1D(name, adv.Mesh1D(0, 0.89, N), np.pi*0.0015**2, np.pi*0.0023, 0.0, fluid, hx_type)
+
+    fc.inlet.initial = (372.1, 6e6, 0.0147/19)
+    fc.outlet.initial = (372.1, 6e6, 0.0147/19)
+
+    fc.Q_dot.initial = Q_dot
+    fc.Q_dot_shape.initial = np.sin(np.linspace(0, 0.89, N - 1)*np.pi/0.89) + 0.1
+    fc.T_wall.initial = 1000
+    fc.T.initial = 500
+    fc.P.initial = 101325
+
+    return fc
+
+def time_case(build, solve, repeat: int, budget: float) -> dict:
+    """ Builds and solves a case up to repeat times, stopping early once
+    budget seconds are spent. Only solve is timed. Returns the fastest and
+    median time.
+    """
+    samples = []
+    start = time.perf_counter()
+
+    while(len(samples) < repeat):
+        case = build()
+
+        # Components and systems log to the console.
+        with contextlib.redirect_stdout(io.StringIO()):
+            t = time.perf_counter()
+            solve(case)
+            samples.append(time.perf_counter() - t)
+
+        if(time.perf_counter() - start > budget):
+            break
+
+    return {"seconds": min(samples), "median": float(np.median(samples)), "repeats": len(samples)}
+
+def channel_case(fluid, hx_type: str, N: int):
+    def build():
+        fc = make_channel("fc", fluid, hx_type, N)
+        fc.check_initials()
+        fc.march()
+
+        return fc
+
+    def solve(fc):
+        fc.solve(1)
+
+    return build, solve
+
+def chain_case(fluid, n: int, N: int = 10):
+    def build():
+        system = adv.System()
+
+        channels = [make_channel("fc" + str(i), fluid, "use_Q_dot", N, Q_dot=0.18e6/19/n) for i in range(n)]
+
+        for fc in channels:
+            system.add_component(fc)
+
+        for upstream, downstream in zip(channels[:-1], channels[1:]):
+            system.connect(upstream.outlet, downstream.inlet)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            system.setup()
+            system.march()
+
+        return system
+
+    def solve(system):
+        system.solve(1, 1e-6, 100)
+
+    return build, solve
+
+def cases(args) -> list:
+    fluids = ["IdealGas"] if args.no_hydrogen else ["IdealGas", "Hydrogen"]
+
+    nodes = [N for N in channel_nodes if not args.quick or N <= quick_nodes]
+    chains = [n for n in chain_lengths if not args.quick or n <= quick_chain]
+
+    suite = []
+
+    for fluid_name in fluids:
+        fluid = build_fluid(fluid_name)
+
+        for hx_type in hx_types:
+            for N in nodes:
+                suite.append(("channel/" + fluid_name + "/" + hx_type + "/N=" + str(N), channel_case(fluid, hx_type, N)))
+
+    ideal_gas = build_fluid("IdealGas")
+
+    for n in chains:
+        suite.append(("chain/IdealGas/n=" + str(n), chain_case(ideal_gas, n)))
+
+    return [(name, case) for name, case in suite if args.filter is None or args.filter in name]
+
+def run_suite(args) -> dict:
+    results = {}
+
+    for name, (build, solve) in cases(args):
+        results[name] = time_case(build, solve, args.repeat, args.budget)
+
+        print("%-44s %10.4f s  (%i runs)" % (name, results[name]["seconds"], results[name]["repeats"]), flush=True)
+
+    return {"meta": {"date": datetime.datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+                     "numpy": np.__version__, "machine": platform.node(), "processor": platform.processor(),
+                     "settings": {"quick": args.quick, "no_hydrogen": args.no_hydrogen, "filter": args.filter,
+                                  "repeat": args.repeat, "budget": args.budget}},
+            "results": results}
+
+def compare(baseline: dict, current: dict, threshold: float) -> int:
+    print("%-44s %12s %12s %8s" % ("Case", "Baseline [s]", "Current [s]", "Change"))
+
+    regressions = []
+
+    for name, base in baseline["results"].items():
+        if(name not in current["results"]):
+            continue
+
+        before = base["seconds"]
+        after = current["results"][name]["seconds"]
+
+        change = after/before - 1
+
+        flag = ""
+        if(change > threshold and after - before > noise_floor):
+            flag = "  REGRESSION"
+            regressions.append(name)
+
+        elif(change < -threshold and before - after > noise_floor):
+            flag = "  faster"
+
+        print("%-44s %12.4f %12.4f %+7.1f%%%s" % (name, before, after, 100*change, flag))
+
+    missing = [name for name in baseline["results"] if name not in current["results"]]
+
+    if(missing):
+        print("Not in the current run: " + ", ".join(missing))
+
+    if(regressions):
+        print("FAILED: %i of %i cases are more than %.0f %% slower than the baseline." % (len(regressions), len(baseline["results"]) - len(missing), 100*threshold))
+        return 1
+
+    print("OK")
+    return 0
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the suite and write a baseline")
+    run.add_argument("--output", default=os.path.join(root, "hot_path_current.json"), help="results file to write")
+
+    check = commands.add_parser("compare", help="compare a run to a baseline")
+    check.add_argument("baseline", help="baseline file")
+    check.add_argument("current", nargs="?", help="results file, by default the suite is run now")
+    check.add_argument("--threshold", type=float, default=0.25, help="allowed relative slow down")
+
+    for command in (run, check):
+        command.add_argument("--quick", action="store_true", help="leave out the largest channels and chains")
+        command.add_argument("--no-hydrogen", action="store_true", help="leave out the CoolProp backend")
+        command.add_argument("--filter", help="only run cases whose name contains this")
+        command.add_argument("--repeat", type=int, default=5, help="maximum number of runs per case")
+        command.add_argument("--budget", type=float, default=2.0, help="seconds per case after which no more runs start")
+
+    args = parser.parse_args(argv)
+
+    if(args.command == "run"):
+        results = run_suite(args)
+
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=1)
+
+        print("Wrote " + args.output)
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+
+    if(args.current is not None):
+        with open(args.current) as file:
+            current = json.load(file)
+
+    else:
+        # Run what the baseline ran.
+        for name, value in baseline["meta"]["settings"].items():
+            setattr(args, name, value)
+
+        current = run_suite(args)
+
+    return compare(baseline, current, args.threshold)
+
+if __name__ == "__main__":
+    sys.exit(main())
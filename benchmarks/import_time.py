@@ -0,0 +1,81 @@
+""" Import time benchmark guarding the startup budget of "import aardvark".
+
+Imports aardvark in fresh interpreters and checks that
+
+    * the median import time is within the budget,
+    * none of the heavy optional dependencies are imported eagerly.
+
+The cost of starting the interpreter itself is measured separately and
+subtracted so the budget only covers aardvark and its eager dependencies.
+
+Run from the repository root:
+
+    python -m benchmarks.import_time [--repeat N] [--budget SECONDS]
+
+Exits with a non-zero status if the budget is exceeded or a heavy dependency
+is imported by "import aardvark".
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+# Dependencies that must only be imported on first use.
+lazy_modules = ("matplotlib", "scipy", "CoolProp")
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run(code: str) -> tuple:
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+    seconds = time.perf_counter() - start
+
+    return seconds, result.stdout
+
+def median(values: list) -> float:
+    values = sorted(values)
+    n = len(values)
+
+    return values[n // 2] if n % 2 else 0.5*(values[n // 2 - 1] + values[n // 2])
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=7, help="number of fresh interpreters per measurement")
+    parser.add_argument("--budget", type=float, default=0.5, help="allowed median import time in seconds")
+    args = parser.parse_args(argv)
+
+    check = "import sys, json, aardvark; print(json.dumps(sorted(set(m.split('.')[0] for m in sys.modules))))"
+
+    baseline = median([run("pass")[0] for _ in range(args.repeat)])
+
+    samples = []
+    for _ in range(args.repeat):
+        seconds, stdout = run(check)
+        samples.append(seconds - baseline)
+
+    loaded = [name for name in lazy_modules if name in json.loads(stdout)]
+
+    import_time = median(samples)
+
+    print("import aardvark: %.3f s median over %i runs (budget %.3f s)" % (import_time, args.repeat, args.budget))
+
+    failed = False
+
+    if(import_time > args.budget):
+        print("FAILED: import time is over budget.")
+        failed = True
+
+    if(loaded):
+        print("FAILED: imported eagerly: " + ", ".join(loaded))
+        failed = True
+
+    if(not failed):
+        print("OK")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+""" Check of jacobi execution against the number of workers with a shared
+CachedFluid.
+
+Runs a bank of channels sharing one CachedFluid with gauss-seidel and with
+jacobi execution on 1, 4 and 8 thread workers and compares the outlets.
+
+    * With rtol = 0 the cache only returns values computed for the exact
+      same state, so every run must give bit-identical outlets.
+    * With rtol > 0 an entry holds the value of whichever state landed in
+      it first, which depends on the order the threads run in. The outlets
+      must then agree within --tolerance relative.
+
+Run from the repository root:
+
+    python -m benchmarks.jacobi_workers [--channels N] [--steps N] [--rtol F]
+
+Exits with a non-zero status if any check fails.
+"""
+import aardvark as adv
+from aardvark.materials.fluids.cached_fluid import CachedFluid
+
+import argparse
+import contextlib
+import io
+import sys
+
+import numpy as np
+
+
+worker_counts = (1, 4, 8)
+
+def build_system(fluid, execution: str, workers: int, n_channels: int) -> tuple:
+    system = adv.System(execution=execution, workers=workers)
+
+    channels = []
+
+    for n in range(n_channels):
+        fc = adv.FlowChannel1D("fc" + str(n), adv.Mesh1D(0, 0.89, 50), np.pi*0.0015**2, np.pi*0.0023, 0.0, fluid, "use_Q_dot", node_solver="newton")
+
+        fc.inlet.initial = (372.1, 6e6, 0.0147/19)
+        fc.outlet.initial = (372.1, 6e6, 0.0147/19)
+
+        # Channels of different power visit different states, so threads
+        # compete for the same cache entries in a different order.
+        fc.Q_dot.initial = 0.18e6/19*(1 + 0.1*n)
+        fc.Q_dot_shape.initial = np.sin(np.linspace(0, 0.89, 49)*np.pi/0.89) + 0.1
+        fc.T_wall.initial = 1000
+        fc.T.initial = 500
+        fc.P.initial = 101325
+
+        system.add_component(fc)
+        channels.append(fc)
+
+    return system, channels
+
+def run(rtol: float, execution: str, workers: int, n_channels: int, steps: int) -> tuple:
+    """ Solves steps time steps and returns the outlets of every channel and
+    the cache counters.
+    """
+    fluid = CachedFluid(adv.fluids.IdealGas("my_hydrogen", 14290, 0.18, 2.016, 0.88e-5), rtol=rtol)
+
+    system, channels = build_system(fluid, execution, workers, n_channels)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        system.setup()
+
+        for step in range(steps):
+            system.march()
+            system.solve(1, 1e-8, 100)
+
+        system.close()
+
+    return np.array([fc.outlet.value for fc in channels]), fluid.stats()
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=8, help="number of channels")
+    parser.add_argument("--steps", type=int, default=3, help="number of time steps")
+    parser.add_argument("--rtol", type=float, default=1e-10, help="rtol of the inexact cache")
+    parser.add_argument("--tolerance", type=float, default=1e-6, help="allowed relative difference with the inexact cache")
+    args = parser.parse_args(argv)
+
+    failed = False
+
+    for rtol in (0.0, args.rtol):
+        reference, _ = run(rtol, "gauss-seidel", 1, args.channels, args.steps)
+
+        print("rtol = %g" % rtol)
+
+        for workers in worker_counts:
+            outlets, stats = run(rtol, "jacobi", workers, args.channels, args.steps)
+
+            difference = float(np.max(np.abs(outlets - reference)/np.abs(reference)))
+
+            if(rtol == 0):
+                passed = np.array_equal(outlets, reference)
+
+            else:
+                passed = difference <= args.tolerance
+
+            print("    %i workers: max relative difference %.3E, %i hits, %i misses  %s"
+                  % (workers, difference, stats["hits"], stats["misses"], "OK" if passed else "FAILED"))
+
+            failed = failed or not passed
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())